@@ -0,0 +1,366 @@
+# benchmark.py
+# Benchmarks for the products core (no GUI needed), run on synthetic catalogs of several sizes.
+# Each benchmark records its best time, throughput and peak memory into a .json file, and can be
+# compared against a stored baseline to catch performance regressions:
+#
+#   python benchmark.py --sizes 1000,10000 --save-baseline benchmark-baseline.json
+#   python benchmark.py --sizes 1000,10000 --baseline benchmark-baseline.json --max-slowdown 0.2
+#
+# The exit code is 1 when any benchmark got slower (or used more memory) than the thresholds allow.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import products
+import searchindex
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_TOPICS = dict(products.topics)
+
+WORDS = ("smart", "mini", "ultra", "eco", "classic", "pro", "max", "lite", "royal", "urban",
+         "phone", "lamp", "chair", "shirt", "cream", "plant", "watch", "table", "drone", "bottle")
+
+# ------ SYNTHETIC DATA ------
+def topic_name(number):
+    # Topic names can only have letters: 0 -> "a", 25 -> "z", 26 -> "ba"...
+    letters = ""
+    while True:
+        number, letter = divmod(number, 26)
+        letters = chr(ord("a") + letter) + letters
+        if not number:
+            return "custom" + letters
+
+def generate_topics(count, seed=0):
+    rng = random.Random(seed)
+    return {topic_name(number): rng.randint(1, 30) for number in range(count)}
+
+def generate_products(size, topic_names=None, seed=0):
+    # Three columns (names, topics, prices) of 'size' products with unique names.
+    # A third of them use custom topics if 'topic_names' is given
+    rng = random.Random(seed)
+    default_topics = list(DEFAULT_TOPICS)
+    topic_names = list(topic_names or ())
+    names, product_topics, prices = [], [], []
+    for number in range(size):
+        names.append(f"{rng.choice(WORDS)} {rng.choice(WORDS)} {number}")
+        if topic_names and number % 3 == 0:
+            product_topics.append(rng.choice(topic_names))
+        else:
+            product_topics.append(rng.choice(default_topics))
+        prices.append(round(rng.uniform(0.5, 2000), 2))
+    return names, product_topics, prices
+
+def write_products_json(filename, size, topic_names=None, seed=0):
+    names, product_topics, prices = generate_products(size, topic_names, seed)
+    with open(filename, "w") as f:
+        json.dump([{"name": name, "topic": topic, "price": price}
+                   for name, topic, price in zip(names, product_topics, prices)], f)
+
+def write_topics_json(filename, count, seed=0):
+    with open(filename, "w") as f:
+        json.dump([{name: tax} for name, tax in generate_topics(count, seed).items()], f)
+
+def topic_count(size):
+    return max(10, size // 100)
+
+def reset():
+    # Back to an empty catalog with only the default topics
+    products.Product.get_instances().clear()
+    products.topics.clear()
+    products.topics.update(DEFAULT_TOPICS)
+    products.touch_catalog()
+    searchindex.cache.clear()
+
+def load_catalog(size):
+    custom = generate_topics(topic_count(size))
+    for name, tax in custom.items():
+        products.create_topic(name, tax)
+    products.create_many(*generate_products(size, custom))
+
+# ------ BENCHMARKS ------
+# Every benchmark gets (size, workdir), prepares what it needs (not timed) and returns
+# the job to time, which returns how many items it processed
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+@benchmark("product_init")
+def bench_product_init(size, workdir):
+    names, product_topics, prices = generate_products(size)
+
+    def job():
+        for name, topic, price in zip(names, product_topics, prices):
+            products.Product(name, topic, price)
+        return size
+    return job
+
+@benchmark("create_many")
+def bench_create_many(size, workdir):
+    columns = generate_products(size)
+    return lambda: len(products.create_many(*columns))
+
+@benchmark("import_json")
+def bench_import_json(size, workdir):
+    filename = os.path.join(workdir, f"products-{size}.json")
+    if not os.path.exists(filename):
+        write_products_json(filename, size)
+
+    def job():
+        products.import_prd_from_json(filename)
+        return size
+    return job
+
+@benchmark("import_json_stream")
+def bench_import_json_stream(size, workdir):
+    filename = os.path.join(workdir, f"products-{size}.json")
+    if not os.path.exists(filename):
+        write_products_json(filename, size)
+
+    def job():
+        products.import_prd_from_json(filename, stream=True)
+        return size
+    return job
+
+@benchmark("export_json")
+def bench_export_json(size, workdir):
+    load_catalog(size)
+    filename = os.path.join(workdir, "export.json")
+
+    def job():
+        products.export_prd_to_json(filename)
+        return size
+    return job
+
+@benchmark("import_topics")
+def bench_import_topics(size, workdir):
+    count = topic_count(size)
+    filename = os.path.join(workdir, f"topics-{count}.json")
+    if not os.path.exists(filename):
+        write_topics_json(filename, count)
+
+    def job():
+        products.import_topics_json(filename)
+        return count
+    return job
+
+@benchmark("export_topics")
+def bench_export_topics(size, workdir):
+    count = topic_count(size)
+    for name, tax in generate_topics(count).items():
+        products.create_topic(name, tax)
+    filename = os.path.join(workdir, "export-topics.json")
+
+    def job():
+        products.export_topics_json(filename)
+        return count
+    return job
+
+@benchmark("delete_products")
+def bench_delete_products(size, workdir):
+    # Deletes a tenth of the catalog one product at a time
+    load_catalog(size)
+    names = list(products.Product.get_instances().names())[::10]
+
+    def job():
+        for name in names:
+            products.delete_products(name)
+        return len(names)
+    return job
+
+@benchmark("delete_products_many")
+def bench_delete_products_many(size, workdir):
+    load_catalog(size)
+    names = list(products.Product.get_instances().names())[::10]
+    return lambda: len(products.delete_products_many(names)[0])
+
+@benchmark("search_index_build")
+def bench_search_index_build(size, workdir):
+    load_catalog(size)
+    index = searchindex.get_index()
+
+    def job():
+        index.rebuild()
+        return size
+    return job
+
+@benchmark("search")
+def bench_search(size, workdir):
+    # Same matching the Searcher does (searchindex.search_names(), then fuzzy_search_names() when
+    # nothing contains the query), over a mix of hits, prefixes, typos and misses, uncached
+    load_catalog(size)
+    rng = random.Random(1)
+    names = list(products.Product.get_instances().names())
+    queries = []
+    for number in range(200):
+        name = rng.choice(names)
+        kind = number % 4
+        if kind == 0:
+            queries.append(name)
+        elif kind == 1:
+            queries.append(name[:rng.randint(3, 8)])
+        elif kind == 2:
+            position = rng.randrange(len(name) - 1)
+            queries.append(name[:position] + name[position + 1] + name[position] + name[position + 2:])
+        else:
+            queries.append(f"missing {number}")
+    searchindex.get_index()._ensure_built()
+    limit = 100
+
+    def job():
+        searchindex.cache.clear()
+        for query in queries:
+            if not searchindex.search_names(query, limit):
+                searchindex.fuzzy_search_names(query, limit=limit)
+        return len(queries)
+    return job
+
+@benchmark("chart")
+def bench_chart(size, workdir):
+    load_catalog(size)
+    selected = list(products.Product.get_instances())
+
+    def job():
+        products.chart(*selected)
+        return size
+    return job
+
+# ------ RUNNER ------
+def run_benchmark(name, size, workdir, repeat=3, memory=True):
+    best = None
+    for _ in range(repeat):
+        reset()
+        job = BENCHMARKS[name](size, workdir)
+        gc.collect()
+        start = time.perf_counter()
+        items = job()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Peak memory is measured on a separate run, tracemalloc slows everything down
+    peak = None
+    if memory:
+        reset()
+        job = BENCHMARKS[name](size, workdir)
+        gc.collect()
+        tracemalloc.start()
+        job()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    reset()
+    return {"name": name, "size": size, "items": items, "seconds": best,
+            "items_per_second": items / best if best else None, "peak_memory": peak}
+
+def run_all(names, sizes, repeat=3, memory=True, report=print):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="products-bench-")
+    try:
+        for size in sizes:
+            for name in names:
+                result = run_benchmark(name, size, workdir, repeat, memory)
+                results[f"{name}/{size}"] = result
+                report(format_result(result))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def format_result(result):
+    peak = result["peak_memory"]
+    memory = f"{peak / 1024 / 1024:10.1f} MB" if peak is not None else f"{'-':>13}"
+    return (f"{result['name']:<22}{result['size']:>9}{result['seconds'] * 1000:>12.1f} ms"
+            f"{result['items_per_second']:>14.0f} items/s{memory}")
+
+# Timings shorter than this are mostly noise, they never count as slowdowns
+MIN_COMPARED_SECONDS = 0.005
+
+def compare(results, baseline, max_slowdown=0.25, max_memory_growth=0.25):
+    # Returns the list of regressions: benchmarks slower than baseline * (1 + max_slowdown)
+    # or using more than baseline * (1 + max_memory_growth) memory
+    regressions = []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if result["seconds"] >= MIN_COMPARED_SECONDS \
+                and result["seconds"] > old["seconds"] * (1 + max_slowdown):
+            regressions.append(f"{key}: {result['seconds'] * 1000:.1f} ms, "
+                               f"baseline {old['seconds'] * 1000:.1f} ms "
+                               f"(+{(result['seconds'] / old['seconds'] - 1) * 100:.0f}%)")
+        if result["peak_memory"] and old.get("peak_memory") \
+                and result["peak_memory"] > old["peak_memory"] * (1 + max_memory_growth):
+            regressions.append(f"{key}: peak memory {result['peak_memory'] / 1024 / 1024:.1f} MB, "
+                               f"baseline {old['peak_memory'] / 1024 / 1024:.1f} MB "
+                               f"(+{(result['peak_memory'] / old['peak_memory'] - 1) * 100:.0f}%)")
+    return regressions
+
+def save_results(filename, results):
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": results,
+    }
+    with open(filename, "w") as f:
+        json.dump(data, f, indent=4)
+
+def load_results(filename):
+    with open(filename) as f:
+        return json.load(f)["results"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the products core")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated catalog sizes (default: %(default)s)")
+    parser.add_argument("--only", help="comma separated benchmarks to run (default: all)")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the best one counts")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory runs")
+    parser.add_argument("--output", default="benchmark-results.json", help="where the results are written")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--save-baseline", metavar="FILE", help="also write the results as the new baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.25,
+                        help="allowed slowdown over the baseline, 0.25 = 25%% (default: %(default)s)")
+    parser.add_argument("--max-memory-growth", type=float, default=0.25,
+                        help="allowed peak memory growth over the baseline (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark/s: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    print(f"{'Benchmark':<22}{'Size':>9}{'Best time':>15}{'Throughput':>22}{'Peak memory':>13}")
+    results = run_all(names, sizes, args.repeat, not args.no_memory)
+    save_results(args.output, results)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        save_results(args.save_baseline, results)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.max_slowdown, args.max_memory_growth)
+        if regressions:
+            print(f"\n{len(regressions)} regression/s against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
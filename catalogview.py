@@ -0,0 +1,150 @@
+# catalogview.py
+# Table windows for the current products and topics.
+# The models only hand rows to the view as it scrolls (fetchMore), so they open instantly
+# whatever the size of the catalog, and they can be sorted by any column.
+
+import products
+
+from PyQt5.QtWidgets import QDialog, QLabel, QTableView, QHeaderView, QVBoxLayout, QAbstractItemView
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+# Base for the catalog models: 'keys' holds one key per row (product or topic name),
+# and only the first 'loaded' of them are shown until the view asks for more
+class LazyTableModel(QAbstractTableModel):
+    PAGE_SIZE = 1000
+    HEADERS = ()
+
+    def __init__(self, keys, parent=None):
+        super().__init__(parent)
+        self.keys = keys
+        self.loaded = min(self.PAGE_SIZE, len(keys))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.keys)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.PAGE_SIZE, len(self.keys) - self.loaded)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.TextAlignmentRole):
+            return None
+        values = self.row_values(self.keys[index.row()])
+        if values is None:
+            return None
+        value = values[index.column()]
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter) if isinstance(value, (int, float)) else None
+        return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Sorts every key, not only the loaded ones, then starts again from the first page
+        sort_keys = self.sort_keys(column)
+        positions = sorted(range(len(self.keys)), key=sort_keys.__getitem__,
+                           reverse=order == Qt.DescendingOrder)
+        self.beginResetModel()
+        self.keys = [self.keys[position] for position in positions]
+        self.loaded = min(self.PAGE_SIZE, len(self.keys))
+        self.endResetModel()
+
+    def row_values(self, key):
+        raise NotImplementedError
+
+    def sort_keys(self, column):
+        # The value of 'column' for every key, in the current order
+        raise NotImplementedError
+
+class ProductTableModel(LazyTableModel):
+    HEADERS = ("Name", "Topic", "Base Price", "Taxed Price")
+
+    def __init__(self, parent=None):
+        # Takes a snapshot of the current names, the values are read from the registry when shown
+        super().__init__(list(products.Product.get_instances().names()), parent)
+
+    def row_values(self, key):
+        product = products.Product.get_instances().get(key)
+        if product is None:
+            # Deleted since the window was opened
+            return None
+        return product.name, product.topic, product.notax_price, product.price
+
+    def sort_keys(self, column):
+        if column == 0:
+            return self.keys
+        # One pass over the columns instead of creating a Product per row
+        values = {name: (topic, notax, price)
+                  for name, topic, notax, price in products.Product.get_instances().rows()}
+        missing = ("", 0.0, 0.0)
+        return [values.get(name, missing)[column - 1] for name in self.keys]
+
+class TopicTableModel(LazyTableModel):
+    HEADERS = ("Topic", "Tax %", "Type")
+
+    def __init__(self, parent=None):
+        super().__init__(list(products.topics), parent)
+        # The first 10 topics are the default ones
+        self.custom = set(list(products.topics)[10:])
+
+    def row_values(self, key):
+        if key not in products.topics:
+            return None
+        return key, products.topics[key], "Custom" if key in self.custom else "Default"
+
+    def sort_keys(self, column):
+        return [self.row_values(key)[column] for key in self.keys]
+
+class CatalogTableDialog(QDialog):
+    def __init__(self, title, model, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(700, 500)
+
+        self.title = QLabel(title, self)
+        self.count_label = QLabel(f"{len(model.keys)} item/s", self)
+        self.model = model
+        self.model.setParent(self)
+        self.table = QTableView(self)
+        self.table.setModel(self.model)
+        # Sorting is only done when a header is clicked, not when it's enabled
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.title)
+        vbox.addWidget(self.table)
+        vbox.addWidget(self.count_label)
+        self.setLayout(vbox)
+
+        self.title.setAlignment(Qt.AlignCenter)
+        self.title.setObjectName("title")
+
+        self.setStyleSheet("""
+            * {
+                font-size: 16px;
+                font-family: Calibri;
+            }
+            QLabel#title{
+                font-size: 22px;
+                font-weight: bold;
+            }
+        """)
@@ -0,0 +1,204 @@
+# journal.py
+# Incremental saving: a snapshot of the whole catalog plus an append-only journal of the changes since.
+# Saving only appends what changed (products created/deleted, topics created/updated), so it costs
+# O(changes) instead of rewriting every product; compact() folds the journal back into the snapshot.
+#
+#   catalog = CatalogJournal("catalog.snap", "catalog.journal")
+#   catalog.load()      # snapshot + journal replay
+#   ...                 # create/delete products, change topics
+#   catalog.save()      # appends the changes (or compacts when the journal grew too big)
+
+import json
+import os
+import threading
+
+import products
+
+class CatalogJournal:
+    # Journal lines are JSON objects, one per change:
+    #   {"op": "add", "name": ..., "topic": ..., "price": ...}   (price before taxes)
+    #   {"op": "remove", "name": ...}
+    #   {"op": "topic", "name": ..., "tax": ...}
+    # Replaying them is idempotent (adds skip existing products, removes and topic taxes just set the state),
+    # so replaying a journal over a snapshot that already contains its changes gives the same catalog.
+    # That's what makes compact() safe: if it stops between writing the snapshot and emptying the journal,
+    # the next load() still ends up with the right products
+
+    # save() compacts instead once the journal would have more entries than this,
+    # or than compact_ratio times the number of products
+    COMPACT_MIN_ENTRIES = 10000
+
+    def __init__(self, snapshot="catalog.snap", journal="catalog.journal", compact_ratio=0.5):
+        # Snapshots and replays always go through the products module, so the journal
+        # works on its catalog (Product.get_instances()) and no other
+        self.snapshot = snapshot
+        self.journal = journal
+        self.compact_ratio = compact_ratio
+        self.registry = products.Product.get_instances()
+        # Changes made since the last save, in order
+        self._pending = []
+        # Set when the whole catalog was replaced, only a compaction can save that
+        self._reset = False
+        # Whether the files on disk hold the catalog the changes apply to, which is only known after
+        # a load() or a compaction. Until then the products and topics that were there before the
+        # journal was created aren't saved anywhere, so the first save() has to compact
+        self._synced = False
+        self._saved_topics = {}
+        self._entries = 0
+        self._replaying = False
+        self._lock = threading.RLock()
+        self.registry.subscribe(self._on_change)
+
+    def close(self):
+        self.registry.unsubscribe(self._on_change)
+
+    def _on_change(self, event, names):
+        if self._replaying:
+            return
+        with self._lock:
+            if event == "add":
+                for name in names:
+                    _, topic, notax_price, _ = self.registry.row(name)
+                    self._pending.append({"op": "add", "name": name, "topic": topic, "price": notax_price})
+            elif event == "remove":
+                self._pending.extend({"op": "remove", "name": name} for name in names)
+            elif event == "reset":
+                self._reset = True
+            # "reprice" only follows a topic tax change, which is saved as a topic entry
+
+    def _topic_changes(self):
+        # Topics are few, so they're compared against the last save instead of being tracked
+        return [{"op": "topic", "name": name, "tax": tax}
+                for name, tax in products.topics.items() if self._saved_topics.get(name) != tax]
+
+    @property
+    def dirty(self):
+        return bool(self._pending or self._reset or not self._synced or self._topic_changes())
+
+    def pending_changes(self):
+        return len(self._pending) + len(self._topic_changes())
+
+    def save(self):
+        # Appends the changes since the last save to the journal. Returns how many entries were written,
+        # or None if the catalog was compacted instead
+        with self._lock:
+            # Topics go first, products added since may use them
+            changes = self._topic_changes() + self._pending
+            limit = max(self.COMPACT_MIN_ENTRIES, len(self.registry) * self.compact_ratio)
+            if (self._reset or not self._synced or not os.path.exists(self.snapshot)
+                    or self._entries + len(changes) > limit):
+                self._compact()
+                return None
+            if not changes:
+                return 0
+
+            data = "".join(json.dumps(change, separators=(",", ":")) + "\n" for change in changes)
+            with open(self.journal, "a", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries += len(changes)
+            self._pending.clear()
+            self._saved_topics = dict(products.topics)
+            return len(changes)
+
+    def compact(self):
+        # Writes the whole catalog to the snapshot and empties the journal
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        products.export_snapshot(self.snapshot)
+        with products.atomic_write(self.journal):
+            pass
+        self._entries = 0
+        self._pending.clear()
+        self._reset = False
+        self._synced = True
+        self._saved_topics = dict(products.topics)
+
+    def load(self):
+        # Replaces the current products with the snapshot (if there's one) and replays the journal on top.
+        # Returns False if the snapshot couldn't be read
+        with self._lock:
+            self._replaying = True
+            try:
+                if os.path.exists(self.snapshot):
+                    if not products.load_snapshot(self.snapshot):
+                        return False
+                else:
+                    self.registry.clear()
+                self._drop_torn_entry()
+                self._entries = self._replay()
+            finally:
+                self._replaying = False
+            self._pending.clear()
+            self._reset = False
+            self._synced = True
+            self._saved_topics = dict(products.topics)
+            return True
+
+    def _drop_torn_entry(self):
+        # If the program died while saving, the last line may be cut short. That entry was never
+        # confirmed as saved, so it's cut off, otherwise the next save would be glued to it
+        try:
+            with open(self.journal, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                end = size
+                while end > 0:
+                    start = max(0, end - 4096)
+                    f.seek(start)
+                    position = f.read(end - start).rfind(b"\n")
+                    if position != -1:
+                        end = start + position + 1
+                        break
+                    end = start
+                if end != size:
+                    products.get_logger().warning("Dropping an incomplete entry at the end of the journal %s", self.journal)
+                    f.truncate(end)
+        except FileNotFoundError:
+            pass
+
+    def _read_entries(self):
+        try:
+            f = open(self.journal, encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for number, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    products.get_logger().warning("Ignoring broken entry %d of the journal %s", number, self.journal)
+                    continue
+                yield entry
+
+    def _replay(self):
+        # Consecutive adds/removes are applied as one batch
+        count = 0
+        batch_op, batch = None, []
+
+        def flush():
+            if batch_op == "add":
+                products.create_many([entry["name"] for entry in batch], [entry["topic"] for entry in batch],
+                                     [entry["price"] for entry in batch], skip_existing=True)
+            elif batch_op == "remove":
+                products.delete_products_many(entry["name"] for entry in batch)
+            batch.clear()
+
+        for entry in self._read_entries():
+            count += 1
+            op = entry.get("op")
+            if op != batch_op:
+                flush()
+                batch_op = op
+            if op == "topic":
+                if entry["name"] in products.topics:
+                    if products.topics[entry["name"]] != entry["tax"]:
+                        products.update_topic_tax(entry["name"], entry["tax"])
+                else:
+                    products.create_topic(entry["name"], entry["tax"])
+            elif op in ("add", "remove"):
+                batch.append(entry)
+        flush()
+        return count
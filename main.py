@@ -1,24 +1,33 @@
-import products
-from searcher import Searcher
-from topicmanager import TopicManager
-from productmanager import ProductManager
+import time
+# Taken before anything else is imported, so --startup-time measures the whole cold start
+START_TIME = time.perf_counter()
+
+import importlib
 import sys
+import products
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QMessageBox, QLabel, QPushButton, QHBoxLayout, QVBoxLayout
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 
 
 class ProductHub(QMainWindow):
+    # attribute -> (module, class) of every tool window. Each module is only imported
+    # and its window only built the first time its button is clicked
+    TOOLS = {
+        "searcher": ("searcher", "Searcher"),
+        "topicman": ("topicmanager", "TopicManager"),
+        "productman": ("productmanager", "ProductManager"),
+    }
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Products Hub")
 
         self.title = QLabel("Products Hub", self)
 
-
-        self.searcher = Searcher()
-        self.topicman = TopicManager()
-        self.productman = ProductManager()
-        # Creates the instances of the tools early for later use
+        self.searcher = None
+        self.topicman = None
+        self.productman = None
+        # The tools are created on first use, see open_tool()
 
         self.searcher_button = QPushButton("Open Searcher", self)
         self.topicman_button = QPushButton("Open Topic Manager", self)
@@ -29,9 +38,9 @@ class ProductHub(QMainWindow):
 
         self.initUI()
 
-        self.searcher_button.clicked.connect(self.searcher.show)
-        self.topicman_button.clicked.connect(self.topicman.show)
-        self.productman_button.clicked.connect(self.productman.show)
+        self.searcher_button.clicked.connect(lambda: self.open_tool("searcher"))
+        self.topicman_button.clicked.connect(lambda: self.open_tool("topicman"))
+        self.productman_button.clicked.connect(lambda: self.open_tool("productman"))
 
         self.show_current_topics_button.clicked.connect(self.show_current_topics)
         self.show_current_products_button.clicked.connect(self.show_current_products)
@@ -130,26 +139,59 @@ class ProductHub(QMainWindow):
         central_widget.setLayout(vbox)
         self.setCentralWidget(central_widget)
 
+    def open_tool(self, attribute):
+        # Builds the tool the first time, later clicks bring the same window back
+        tool = getattr(self, attribute)
+        if tool is None:
+            module_name, class_name = self.TOOLS[attribute]
+            tool = getattr(importlib.import_module(module_name), class_name)()
+            setattr(self, attribute, tool)
+        tool.show()
+        tool.raise_()
+        tool.activateWindow()
+        return tool
+
     def show_current_products(self):
         if products.Product.get_instances():
-            info = ("Current products:\n"
-                    "Format: name / topic / price\n\n")
-            for product in products.Product.get_instances():
-                info += f"- {product.name} / {product.topic} / ${product.price}\n"
-            QMessageBox.information(self, "Current Products", info)
+            from catalogview import CatalogTableDialog, ProductTableModel
+            dialog = CatalogTableDialog("Current Products", ProductTableModel(), self)
+            dialog.exec_()
         else:
             QMessageBox.warning(self, "Current Products", "No products found")
 
     def show_current_topics(self):
-        current_topics = ("--------------------\n"
-        "  Current Topics:  \n"
-        "--------------------")
-        for key, value in products.topics.items():
-            current_topics += f"\n{value}% - {key} "
-        QMessageBox.information(self, "Tax Help", current_topics)
+        from catalogview import CatalogTableDialog, TopicTableModel
+        dialog = CatalogTableDialog("Current Topics", TopicTableModel(), self)
+        dialog.exec_()
+
+def report_startup_time(target_ms):
+    # Prints the time from the start of the process to the first window being shown,
+    # then quits. The exit code is 1 if it took longer than 'target_ms'
+    elapsed_ms = (time.perf_counter() - START_TIME) * 1000
+    print(f"Time to first window: {elapsed_ms:.1f} ms", end="")
+    if target_ms is None:
+        print()
+        QApplication.exit(0)
+    else:
+        print(f" (target {target_ms:.0f} ms, {'OK' if elapsed_ms <= target_ms else 'TOO SLOW'})")
+        QApplication.exit(0 if elapsed_ms <= target_ms else 1)
+
+def parse_startup_time(argv):
+    # 'python main.py --startup-time [TARGET_MS]' -> (True, target or None)
+    if "--startup-time" not in argv:
+        return False, None
+    position = argv.index("--startup-time")
+    try:
+        return True, float(argv[position + 1])
+    except (IndexError, ValueError):
+        return True, None
 
 if __name__ == "__main__":
+    measure_startup, target_ms = parse_startup_time(sys.argv)
     app = QApplication(sys.argv)
     product_hub = ProductHub()
     product_hub.show()
+    if measure_startup:
+        # Runs once the event loop has processed the first show/paint events
+        QTimer.singleShot(0, lambda: report_startup_time(target_ms))
     sys.exit(app.exec_())
\ No newline at end of file
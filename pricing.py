@@ -0,0 +1,111 @@
+# pricing.py
+# Fixed-point pricing engine: prices as integer cents and topic taxes as exact integer ratios.
+# Taxed prices and totals computed here are exact and the same on every machine,
+# unlike summing the float prices of millions of products.
+#
+# Product.price is still computed with floats by products.py, and a price ending in half a cent can come
+# out one cent apart from taxed_cents(). Use catalog_total_cents() for an exact fixed-point valuation
+# (productcli stats --exact), and displayed_total_cents() for the sum of the prices products show.
+
+from fractions import Fraction
+
+import products
+
+def to_cents(amount) -> int:
+    return round(amount * 100)
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+def tax_ratio(tax):
+    # 'tax' percent as the exact ratio (numerator, denominator) the base price is multiplied by,
+    # e.g. 16% -> (29, 25) and 7.5% -> (43, 40)
+    ratio = Fraction(100) + Fraction(str(tax))
+    ratio /= 100
+    return ratio.numerator, ratio.denominator
+
+def _apply_ratio(cents, numerator, denominator):
+    # cents * numerator / denominator rounded to the nearest cent, halves away from zero
+    sign = -1 if cents < 0 else 1
+    return sign * ((abs(cents) * numerator * 2 + denominator) // (denominator * 2))
+
+class PricingEngine:
+    # Keeps the ratio of every topic precomputed. The ratios are refreshed automatically
+    # whenever the catalog changes (a new topic or a tax update)
+    def __init__(self):
+        self._ratios = {}
+        self._generation = None
+
+    def ratios(self):
+        generation = products.catalog_generation()
+        if generation != self._generation:
+            self._ratios = {topic: tax_ratio(tax) for topic, tax in products.topics.items()}
+            self._generation = generation
+        return self._ratios
+
+    def taxed_cents(self, base_cents: int, topic: str) -> int:
+        ratios = self.ratios()
+        numerator, denominator = ratios.get(topic, ratios["default"])
+        return _apply_ratio(base_cents, numerator, denominator)
+
+    def taxed_cents_many(self, base_cents, topic_codes, topic_table):
+        # Batch version of taxed_cents(): 'topic_codes' index into 'topic_table' (a list of topic names).
+        # Returns a NumPy int64 array when NumPy is available, a list otherwise
+        ratios = self.ratios()
+        table = [ratios.get(topic, ratios["default"]) for topic in topic_table]
+        # NumPy is optional, batches fall back to plain Python without it
+        numpy = products.get_numpy()
+        if numpy is None:
+            return [_apply_ratio(cents, *table[code]) for cents, code in zip(base_cents, topic_codes)]
+
+        cents = numpy.asarray(base_cents, dtype=numpy.int64)
+        codes = numpy.asarray(topic_codes, dtype=numpy.intp)
+        numerators = numpy.array([ratio[0] for ratio in table], dtype=numpy.int64)[codes]
+        denominators = numpy.array([ratio[1] for ratio in table], dtype=numpy.int64)[codes]
+        signs = numpy.where(cents < 0, -1, 1)
+        return signs * ((numpy.abs(cents) * numerators * 2 + denominators) // (denominators * 2))
+
+    def catalog_cents(self):
+        # (base cents, fixed-point taxed cents) of every product, in creation order
+        names, codes, notax, _, topic_table = products.Product.get_instances().columns()
+        rows = _live_rows(names)
+        numpy = products.get_numpy()
+        if numpy is not None:
+            rows = numpy.asarray(rows, dtype=numpy.intp)
+            base = numpy.rint(numpy.frombuffer(notax, dtype=numpy.float64)[rows] * 100).astype(numpy.int64)
+            topic_codes = numpy.frombuffer(codes, dtype=numpy.uint16)[rows]
+        else:
+            base = [to_cents(notax[row]) for row in rows]
+            topic_codes = [codes[row] for row in rows]
+        return base, self.taxed_cents_many(base, topic_codes, topic_table)
+
+    def catalog_total_cents(self) -> int:
+        # Exact sum of every fixed-point taxed price, in cents
+        _, taxed = self.catalog_cents()
+        if not isinstance(taxed, list):
+            # int64 holds totals up to ~92 quadrillion dollars, which is plenty
+            return int(taxed.sum())
+        return sum(taxed)
+
+def _live_rows(names):
+    if None in names:
+        return [row for row, name in enumerate(names) if name is not None]
+    return range(len(names))
+
+def displayed_total_cents() -> int:
+    # Exact sum of the taxed prices the products show (Product.price), in cents
+    names, _, _, prices, _ = products.Product.get_instances().columns()
+    rows = _live_rows(names)
+    numpy = products.get_numpy()
+    if numpy is not None:
+        rows = numpy.asarray(rows, dtype=numpy.intp)
+        return int(numpy.rint(numpy.frombuffer(prices, dtype=numpy.float64)[rows] * 100).astype(numpy.int64).sum())
+    return sum(to_cents(prices[row]) for row in rows)
+
+engine = PricingEngine()
+
+def taxed_cents(base_cents: int, topic: str) -> int:
+    return engine.taxed_cents(base_cents, topic)
+
+def catalog_total_cents() -> int:
+    return engine.catalog_total_cents()
@@ -0,0 +1,243 @@
+# productcli.py
+# Command line interface for the products core, for batch jobs on machines without a display.
+# It only needs 'products' (and the other GUI-free modules), never PyQt5.
+#
+#   python -m productcli --products catalog.json import feed.json
+#   python -m productcli --products catalog.json search "iphone" --fuzzy 1
+#
+# Every run starts from an empty catalog: --products and --topics are loaded first (if they exist),
+# and the commands that change them (import, topic import) write them back once they're done.
+
+import argparse
+import os
+import sys
+from contextlib import redirect_stdout
+
+import products
+
+# The default topics can't be saved in a topics file, so they can't be changed from one either
+DEFAULT_TOPICS = frozenset(list(products.topics)[:10])
+
+def load_catalog(args):
+    # Topics go first, otherwise the products of custom topics would fall back to 'default'.
+    # The messages products.py prints go to stderr, stdout is kept for the command's output.
+    # Returns how many products of --products had a topic that isn't loaded
+    rejects = products.RejectLog(args.products)
+    with redirect_stdout(sys.stderr):
+        if args.topics and os.path.exists(args.topics):
+            if products.import_topics_json(args.topics) is False:
+                raise SystemExit(f"Couldn't load the topics from {args.topics}")
+        if args.products and os.path.exists(args.products):
+            if not products.import_prd_from_json(args.products, stream=True, batch_size=args.batch_size,
+                                                 rejects=rejects):
+                raise SystemExit(f"Couldn't load the products from {args.products}")
+    return rejects.counts.get("unknown_topic", 0)
+
+def save_products(args):
+    # Refuses to write --products back if some of its products lost their topic while loading,
+    # saving them would turn their topic into 'default' for good
+    if args.unknown_topics:
+        raise SystemExit(f"{args.unknown_topics} product/s in {args.products} use topics that aren't loaded, "
+                         f"not saving it (pass the topics file with --topics)")
+    products.export_prd_to_json(args.products, compact=getattr(args, "compact", False))
+
+def require(path, option):
+    if not path:
+        raise SystemExit(f"This command needs {option} to know where to save the result")
+    return path
+
+def write_lines(lines):
+    # Streams the output instead of building it whole, and stops quietly if the reader
+    # goes away (e.g. piped into 'head')
+    try:
+        for line in lines:
+            sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Python would complain again when flushing stdout on exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+
+def cmd_import(args):
+    target = require(args.products, "--products")
+    if args.unknown_topics:
+        # Checked before importing anything, nothing could be saved afterwards
+        save_products(args)
+    before = len(products.Product.get_instances())
+    with redirect_stdout(sys.stderr):
+        if len(args.files) > 1:
+            report = products.import_many(args.files, workers=args.workers, reject_report=args.reject_report)
+            failed = report["failed"]
+        else:
+            ok = products.import_prd_from_json(args.files[0], stream=True, batch_size=args.batch_size,
+                                               reject_report=args.reject_report)
+            failed = [] if ok else args.files
+    imported = len(products.Product.get_instances()) - before
+    save_products(args)
+    print(f"{imported} product/s imported, {len(products.Product.get_instances())} in {target}")
+    for filename in failed:
+        print(f"Couldn't import {filename}", file=sys.stderr)
+    return 1 if failed else 0
+
+def cmd_export(args):
+    if not products.Product.get_instances():
+        print("No products to export", file=sys.stderr)
+    products.export_prd_to_json(args.file, compact=args.compact, ndjson=args.ndjson)
+    print(f"{len(products.Product.get_instances())} product/s exported to {args.file}")
+    return 0
+
+def cmd_search(args):
+    import searchindex
+
+    if args.fuzzy is not None:
+        results = searchindex.fuzzy_search(args.query, max_distance=args.fuzzy, limit=args.limit)
+        write_lines(f"{product.name}\t{product.topic}\t{product.price:.2f}\t{distance}"
+                    for product, distance in results)
+    else:
+        results = searchindex.search(args.query, limit=args.limit, prefix=args.prefix)
+        write_lines(f"{product.name}\t{product.topic}\t{product.price:.2f}" for product in results)
+    return 0 if results else 1
+
+def cmd_chart(args):
+    registry = products.Product.get_instances()
+    if args.names:
+        selected = [registry.get(name) for name in args.names]
+        missing = [name for name, product in zip(args.names, selected) if product is None]
+        for name in missing:
+            print(f"Product '{name}' not found", file=sys.stderr)
+        selected = [product for product in selected if product is not None]
+    else:
+        selected = products.query(args.topic, args.min_price, args.max_price, args.order_by, args.limit)
+    print(products.chart(*selected))
+    return 0
+
+def cmd_topic_import(args):
+    target = require(args.topics, "--topics")
+    data = products.import_topics_json(args.file, preview=True)
+    if not data:
+        print(f"No topics found in {args.file}", file=sys.stderr)
+        return 1
+    created = updated = refused = 0
+    for topic in data:
+        for name, tax in topic.items():
+            if name in DEFAULT_TOPICS:
+                print(f"'{name}' is a default topic, its tax can't be changed from a topics file", file=sys.stderr)
+                refused += 1
+                continue
+            # Topics that already exist get the tax from the file, like a fresh import would give them
+            try:
+                # create_topic() takes any tax, but a topic without a numeric one breaks every price of it
+                if isinstance(tax, bool) or not isinstance(tax, (int, float)):
+                    raise ValueError("Tax must be a number")
+                if name in products.topics:
+                    if products.topics[name] != tax:
+                        products.update_topic_tax(name, tax)
+                        updated += 1
+                else:
+                    products.create_topic(name, tax)
+                    created += 1
+            except ValueError as error:
+                print(f"Skipping topic '{name}': {error}", file=sys.stderr)
+                refused += 1
+    products.export_topics_json(target)
+    print(f"{created} topic/s created, {updated} updated in {target}")
+    if updated and args.products:
+        # The products of the updated topics were repriced, keep the saved catalog in sync
+        save_products(args)
+    return 1 if refused else 0
+
+def cmd_topic_export(args):
+    products.export_topics_json(args.file, args.names or None)
+    print(f"Topics exported to {args.file}")
+    return 0
+
+def cmd_stats(args):
+    import pricing
+
+    registry = products.Product.get_instances()
+    counts = {}
+    min_price = max_price = None
+    for _, topic, _, price in registry.rows():
+        counts[topic] = counts.get(topic, 0) + 1
+        if min_price is None or price < min_price:
+            min_price = price
+        if max_price is None or price > max_price:
+            max_price = price
+
+    lines = [f"Products: {len(registry)}",
+             f"Topics: {len(products.topics)} ({len(products.topics) - 10} custom)"]
+    if registry:
+        lines.append(f"Taxed price: {min_price:.2f} - {max_price:.2f}")
+        # The sum of the prices shown, added up in cents so it doesn't drift
+        lines.append(f"Catalog value: {pricing.from_cents(pricing.displayed_total_cents()):.2f}")
+        if args.exact:
+            # Every taxed price computed again in integer cents, reproducible to the cent on any machine
+            lines.append(f"Exact catalog value: {pricing.from_cents(pricing.catalog_total_cents()):.2f}")
+        lines.append("")
+        lines.append(f"{'Topic':<15}{'Tax %':>8}{'Products':>12}")
+        for topic, count in sorted(counts.items(), key=lambda item: -item[1]):
+            lines.append(f"{topic:<15}{products.topics.get(topic, 0):>8}{count:>12}")
+    write_lines(lines)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="productcli", description="Manage products and topics without the GUI")
+    parser.add_argument("--products", metavar="FILE", help="products .json loaded first (and saved by 'import')")
+    parser.add_argument("--topics", metavar="FILE", help="topics .json loaded first (and saved by 'topic import')")
+    parser.add_argument("--batch-size", type=int, default=10000, help="products committed at a time while importing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="import product files into --products")
+    command.add_argument("files", nargs="+", metavar="FILE")
+    command.add_argument("--workers", type=int, help="processes parsing the files when there are several")
+    command.add_argument("--compact", action="store_true", help="save --products without indentation")
+    command.add_argument("--reject-report", metavar="FILE", help="write the rejected items (by reason) to a .json")
+    command.set_defaults(func=cmd_import)
+
+    command = commands.add_parser("export", help="write the products to another file")
+    command.add_argument("file", metavar="FILE")
+    output = command.add_mutually_exclusive_group()
+    output.add_argument("--compact", action="store_true", help="JSON without indentation")
+    output.add_argument("--ndjson", action="store_true", help="one product per line")
+    command.set_defaults(func=cmd_export)
+
+    command = commands.add_parser("search", help="search products by name")
+    command.add_argument("query")
+    command.add_argument("--prefix", action="store_true", help="only names starting with the query")
+    command.add_argument("--fuzzy", type=int, metavar="TYPOS", help="allow up to TYPOS typos")
+    command.add_argument("--limit", type=int)
+    command.set_defaults(func=cmd_search)
+
+    command = commands.add_parser("chart", help="show a price chart of some products")
+    command.add_argument("names", nargs="*", metavar="NAME", help="products to show (default: all matching the filters)")
+    command.add_argument("--topic")
+    command.add_argument("--min-price", type=float)
+    command.add_argument("--max-price", type=float)
+    # Descending orders have to be given as --order-by=-price, argparse takes "-price" for an option otherwise
+    command.add_argument("--order-by", choices=("price", "-price", "name", "-name"))
+    command.add_argument("--limit", type=int)
+    command.set_defaults(func=cmd_chart)
+
+    topic = commands.add_parser("topic", help="import or export custom topics")
+    topic_commands = topic.add_subparsers(dest="topic_command", required=True)
+    command = topic_commands.add_parser("import", help="add the topics of a file to --topics")
+    command.add_argument("file", metavar="FILE")
+    command.set_defaults(func=cmd_topic_import)
+    command = topic_commands.add_parser("export", help="write the custom topics to a file")
+    command.add_argument("file", metavar="FILE")
+    command.add_argument("names", nargs="*", metavar="NAME", help="topics to export (default: all)")
+    command.set_defaults(func=cmd_topic_export)
+
+    command = commands.add_parser("stats", help="show a summary of the catalog")
+    command.add_argument("--exact", action="store_true",
+                         help="also total the catalog with fixed-point taxes (see pricing.py)")
+    command.set_defaults(func=cmd_stats)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.unknown_topics = load_catalog(args)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
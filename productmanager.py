@@ -1,11 +1,16 @@
 import products
+from taskrunner import TaskDialog, format_bytes
+import os
 import sys
-from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QPushButton, QDialog, QCheckBox,
+from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QPushButton, QDialog, QListView,
                              QLineEdit, QHBoxLayout, QVBoxLayout, QMessageBox, QInputDialog,
                              QDialogButtonBox)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel
 
 class ProductManager(QWidget):
+    # Products committed at a time while importing (the import can be cancelled between batches)
+    IMPORT_BATCH_SIZE = 2000
+
     def __init__(self):
         super().__init__()
         self.title = QLabel("Product Manager", self)
@@ -107,57 +112,150 @@ class ProductManager(QWidget):
             return
         product_deleter = ProductDeleter()
         if product_deleter.exec_():
-            selected = product_deleter.get_selected_products()
-            for prd in selected:
-                products.delete_products(prd.name)
-
-
+            # All the selected products are removed in a single pass
+            deleted, _ = products.delete_products_many(product_deleter.get_selected_names())
+            if deleted:
+                self.message_label.setText(f"{len(deleted)} product/s deleted")
 
     def import_prd(self):
-        success = False
-
         default = QMessageBox.question(self, "Import", "Would you like to use default file (products.json)?")
         if default == QMessageBox.Yes:
-            success = products.import_prd_from_json() ## Will import from products.json
+            file = "products.json" ## Will import from products.json
         else:
             file, ok = QInputDialog.getText(self, "Import", "Enter the directory of the file being imported (.json needed):")
-            if ok and file:
-                success = products.import_prd_from_json(file)
-
-        if success:
+            if not (ok and file):
+                QMessageBox.critical(self, "Error Importing", "Could not import the file.\nMake sure it exists and is valid.")
+                return
+
+        # The import runs in the background, committing products (and reporting progress) every
+        # IMPORT_BATCH_SIZE items read, so it can be cancelled between them even if they're all duplicates
+        registry = products.Product.get_instances()
+        before = len(registry)
+        size = os.path.getsize(file) if os.path.isfile(file) else 0
+        dialog = TaskDialog("Importing Products",
+                            lambda progress, cancel: products.import_prd_from_json(
+                                file, stream=True, batch_size=self.IMPORT_BATCH_SIZE,
+                                progress=progress, cancel=cancel),
+                            size, "bytes", self)
+        dialog.exec_()
+        imported = len(registry) - before
+
+        if dialog.status == "cancelled":
+            self.message_label.setText("Import cancelled")
+            QMessageBox.information(self, "Import Cancelled",
+                                    f"{imported} product/s were imported before cancelling.")
+        elif dialog.status == "done" and dialog.result:
             self.message_label.setText("Successfully imported!")
+            QMessageBox.information(self, "Import Finished",
+                                    f"· Items read: {dialog.items} ({format_bytes(dialog.bytes)})\n"
+                                    f"· Products imported: {imported}\n"
+                                    f"· Already existing: {max(0, dialog.items - imported - dialog.rejects)}\n"
+                                    f"· Broken products: {dialog.rejects}")
         else:
             QMessageBox.critical(self, "Error Importing", "Could not import the file.\nMake sure it exists and is valid.")
 
     def export_prd(self):
         default = QMessageBox.question(self, "Export", "Would you like to export to the default file (products.json)?")
         if default == QMessageBox.Yes:
-            if products.Product.get_instances():
-                products.export_prd_to_json() ## Will export to products.json
-            else:
-                QMessageBox.critical(self, "Error Exporting", "There are no products to export")
+            file = "products.json" ## Will export to products.json
         else:
             file, ok = QInputDialog.getText(self, "Import",
                                             "Enter the directory of where you want to export the file(.json needed):")
-            if (ok and file) and products.Product.get_instances():
-                products.export_prd_to_json(file)
-                self.message_label.setText("Successfully exported!")
-            else:
+            if not (ok and file):
                 QMessageBox.critical(self, "Error Exporting", "There are no products to export")
+                return
+
+        registry = products.Product.get_instances()
+        if not registry:
+            QMessageBox.critical(self, "Error Exporting", "There are no products to export")
+            return
 
+        # Exports are written to a temporary file first, so cancelling leaves the old file as it was
+        dialog = TaskDialog("Exporting Products",
+                            lambda progress, cancel: products.export_prd_to_json(
+                                file, progress=progress, cancel=cancel),
+                            len(registry), "items", self)
+        dialog.exec_()
+
+        if dialog.status == "cancelled":
+            self.message_label.setText("Export cancelled")
+        elif dialog.status == "done":
+            self.message_label.setText("Successfully exported!")
+            QMessageBox.information(self, "Export Finished",
+                                    f"{dialog.items} product/s exported to {file} ({format_bytes(dialog.bytes)})")
+        else:
+            QMessageBox.critical(self, "Error Exporting", f"Could not export the products:\n{dialog.error}")
+
+
+# List model with a checkbox for every product name.
+# The checks are one byte per row, so (un)checking everything never touches any widget
+class ProductCheckModel(QAbstractListModel):
+    def __init__(self, names, parent=None):
+        super().__init__(parent)
+        self.names = names
+        self.checked = bytearray(len(names))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.names[index.row()]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checked[index.row()] else Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+        self.checked[index.row()] = value == Qt.Checked
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def set_checked(self, state, rows=None):
+        # Checks/unchecks the given rows (all of them if None)
+        if not self.names:
+            return
+        if rows is None:
+            self.checked = bytearray(b"\x01" if state else b"\x00") * len(self.names)
+        else:
+            for row in rows:
+                self.checked[row] = state
+        self.dataChanged.emit(self.index(0), self.index(len(self.names) - 1), [Qt.CheckStateRole])
 
-# Window just for deleting products, with checkboxes
+    def checked_names(self):
+        return [name for name, checked in zip(self.names, self.checked) if checked]
+
+# Window just for deleting products, with a checkable list.
+# Only the visible rows are ever drawn, so it opens instantly whatever the number of products
 class ProductDeleter(QDialog):
     def __init__(self):
         super().__init__()
 
         self.setMinimumWidth(250)
+        self.setMinimumHeight(400)
 
         self.setWindowTitle("Product deleter")
         self.title = QLabel("Delete Products", self)
+        self.filter_box = QLineEdit(self)
+        self.filter_box.setPlaceholderText("Filter products")
         self.select_all_button = QPushButton("Select All", self)
         self.unselect_all_button = QPushButton("Unselect All", self)
-        self.checkboxes = list()
+
+        self.model = ProductCheckModel(list(products.Product.get_instances().names()), self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.list_view = QListView(self)
+        self.list_view.setModel(self.proxy)
+        self.list_view.setUniformItemSizes(True)
 
         self.title.setAlignment(Qt.AlignCenter)
 
@@ -165,20 +263,16 @@ class ProductDeleter(QDialog):
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
 
+        self.filter_box.textChanged.connect(self.proxy.setFilterFixedString)
         self.select_all_button.clicked.connect(self.select_all)
         self.unselect_all_button.clicked.connect(self.unselect_all)
 
         vbox = QVBoxLayout()
         vbox.addWidget(self.title)
+        vbox.addWidget(self.filter_box)
         vbox.addWidget(self.select_all_button)
         vbox.addWidget(self.unselect_all_button)
-
-        for product in products.Product.get_instances():
-            checkbox = QCheckBox(f"{product.name}")
-            checkbox.prd = product
-            self.checkboxes.append(checkbox)
-            vbox.addWidget(checkbox)
-
+        vbox.addWidget(self.list_view)
         vbox.addWidget(button_box)
 
         self.setLayout(vbox)
@@ -190,20 +284,24 @@ class ProductDeleter(QDialog):
             }
         """)
 
+    def get_selected_names(self):
+        return self.model.checked_names()
+
     def get_selected_products(self):
-        return [
-            cb.prd
-            for cb in self.checkboxes if cb.isChecked()
-        ]
+        registry = products.Product.get_instances()
+        return [registry.get(name) for name in self.model.checked_names()]
+
+    def visible_rows(self):
+        # Rows shown by the filter, or None if it shows all of them
+        if not self.filter_box.text():
+            return None
+        return [self.proxy.mapToSource(self.proxy.index(row, 0)).row() for row in range(self.proxy.rowCount())]
 
     def select_all(self):
-        for cb in self.checkboxes:
-            cb.setChecked(True)
+        self.model.set_checked(True, self.visible_rows())
 
     def unselect_all(self):
-        for cb in self.checkboxes:
-            cb.setChecked(False)
-
+        self.model.set_checked(False, self.visible_rows())
 
 
 if __name__ == "__main__":
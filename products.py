@@ -2,8 +2,33 @@
 # Core module for defining and handling product-related logic.
 # Includes tax calculation, product management, topic creation, and JSON I/O functions.
 
+import bisect
+import codecs
+import functools
 import json
-import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from contextlib import contextmanager, nullcontext
+
+# Heavy or rarely needed modules are imported the first time they're used, so importing
+# 'products' stays fast (NumPy alone can take longer than the whole GUI to start)
+_numpy = False
+
+def get_numpy():
+    # NumPy is optional, batch functions fall back to plain Python without it
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
 
 def tax_help():
     info = (
@@ -41,6 +66,16 @@ def tax_help():
 
     return info
 
+# Counts every change to the products or topics, so caches can tell when they're outdated
+_generation = 0
+
+def catalog_generation() -> int:
+    return _generation
+
+def touch_catalog() -> None:
+    global _generation
+    _generation += 1
+
 # ------ TOPICS ------
 topics = {
     "default": 10,
@@ -56,12 +91,157 @@ topics = {
 }
 # ---------------------
 
-logging.basicConfig(
-    filename="error-log.txt",
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+_log_listener = None
+_log_lock = threading.Lock()
+
+def get_logger():
+    # The "products" logger, set up (and error-log.txt created) the first time something is logged.
+    # Records only go into a queue; a background thread writes them to the file,
+    # so logging never waits on disk I/O
+    global _log_listener
+    import logging
+    if _log_listener is None:
+        with _log_lock:
+            if _log_listener is None:
+                import atexit
+                import logging.handlers
+                import queue
+
+                file_handler = logging.FileHandler("error-log.txt")
+                file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s",
+                                                            datefmt="%Y-%m-%d %H:%M:%S"))
+                log_queue = queue.SimpleQueue()
+                logger = logging.getLogger("products")
+                logger.setLevel(logging.DEBUG)
+                logger.addHandler(logging.handlers.QueueHandler(log_queue))
+                logger.propagate = False
+                listener = logging.handlers.QueueListener(log_queue, file_handler)
+                listener.start()
+                # Writes whatever is still queued when the program ends
+                atexit.register(listener.stop)
+                _log_listener = listener
+    return logging.getLogger("products")
+
+# ------ INSTRUMENTATION ------
+# Opt-in counters and timing histograms for the hot paths (product creation, taxes,
+# imports/exports, searches). Turned on with enable_stats() or the PRODUCTS_STATS
+# environment variable; while off, every hook is a single check of '_stats_enabled'.
+# Counters inside per-product loops are added once per batch, never once per product
+_stats_enabled = bool(os.environ.get("PRODUCTS_STATS"))
+_stats_lock = threading.Lock()
+_counters = {}
+_timings = {}
+
+def enable_stats(enabled: bool = True) -> None:
+    global _stats_enabled
+    _stats_enabled = enabled
+
+def stats_enabled() -> bool:
+    return _stats_enabled
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _counters.clear()
+        _timings.clear()
+
+def add_count(name: str, amount: int = 1) -> None:
+    if _stats_enabled:
+        with _stats_lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+def record_time(name: str, seconds: float) -> None:
+    # Timings are kept as count/total/min/max plus a histogram with power of 2 buckets
+    # of microseconds (bucket b holds the times up to 2**b µs)
+    bucket = int(seconds * 1e6).bit_length()
+    with _stats_lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {"count": 0, "total": 0.0, "min": seconds, "max": seconds, "buckets": {}}
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["min"] = min(timing["min"], seconds)
+        timing["max"] = max(timing["max"], seconds)
+        timing["buckets"][bucket] = timing["buckets"].get(bucket, 0) + 1
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_time(self.name, time.perf_counter() - self.start)
+        return False
+
+_NO_TIMER = nullcontext()
+
+def timed(name: str):
+    # 'with timed("import.commit"):' records how long the block took, if stats are enabled
+    return _Timer(name) if _stats_enabled else _NO_TIMER
+
+def instrumented(name: str):
+    # Decorator timing every call of a function as 'name', for whole operations (imports, exports...)
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _stats_enabled:
+                return function(*args, **kwargs)
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def stats() -> dict:
+    # Snapshot of every counter and timing recorded since the last reset_stats().
+    # Times are in seconds, histogram keys are the upper bound of each bucket
+    with _stats_lock:
+        timings = {}
+        for name, timing in _timings.items():
+            histogram = {}
+            for bucket in sorted(timing["buckets"]):
+                bound = 1 << bucket
+                label = f"<={bound}us" if bound < 1000 else f"<={bound / 1000:g}ms"
+                histogram[label] = timing["buckets"][bucket]
+            timings[name] = {"count": timing["count"], "total": timing["total"],
+                             "mean": timing["total"] / timing["count"],
+                             "min": timing["min"], "max": timing["max"], "histogram": histogram}
+        return {"enabled": _stats_enabled, "counters": dict(_counters), "timings": timings}
+
+@contextmanager
+def profile(operation: str, filename=None, memory=False):
+    # Runs the block under cProfile and writes the stats to 'filename' (<operation>.prof by default),
+    # readable with pstats or snakeviz. With memory=True tracemalloc also runs, and the lines that
+    # allocated the most are written next to it (<operation>.prof.mem.txt).
+    # The block's total time is recorded as "profile.<operation>" even if stats are disabled
+    import cProfile
+    import tracemalloc
+
+    filename = filename or f"{operation}.prof"
+    profiler = cProfile.Profile()
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        record_time(f"profile.{operation}", time.perf_counter() - start)
+        profiler.dump_stats(filename)
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if tracing:
+                tracemalloc.stop()
+            with open(f"{filename}.mem.txt", "w") as f:
+                f.write(f"Peak traced memory of '{operation}': {peak / 1024 / 1024:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
 
 def create_topic(name: str, tax: int) -> None:
     # Adds a new custom topics to the topics dictionary
@@ -70,110 +250,992 @@ def create_topic(name: str, tax: int) -> None:
     if name in topics:
         raise ValueError(f"Topic '{name}' already exists")
     topics[name] = tax
+    touch_catalog()
 
 def apply_taxes(topic_name: str, base: float) -> float:
+    if _stats_enabled:
+        add_count("taxes.applied")
     tax = topics.get(topic_name)
     return base * (1 + tax / 100)
 
+def update_topic_tax(name: str, tax) -> int:
+    # Changes the tax of an existing topic and reprices all its products in one batch,
+    # giving each one the same price a new Product would get. Returns how many were repriced
+    if name not in topics:
+        raise ValueError(f"Topic '{name}' doesn't exist")
+    if isinstance(tax, bool) or not isinstance(tax, (int, float)):
+        raise ValueError("Tax must be a number")
+    topics[name] = tax
+    touch_catalog()
+
+    registry = Product.get_instances()
+    rows = registry.topic_rows(name)
+    if not rows:
+        return 0
+    # Same factor apply_taxes() uses
+    multiplier = 1 + tax / 100
+    notax = registry._notax
+    numpy = get_numpy()
+    if numpy is not None:
+        taxed = (numpy.asarray([notax[row] for row in rows], dtype=numpy.float64) * multiplier).tolist()
+    else:
+        taxed = [notax[row] * multiplier for row in rows]
+    registry.reprice(rows, [round(price, 2) for price in taxed])
+    return len(rows)
+
+def normalize_name(name: str) -> str:
+    # Products are stored and looked up by their titled name, so "iphone 15",
+    # "IPHONE 15" and "Iphone 15" all point to the same product
+    return name.title()
+
+class ProductRegistry:
+    # Column store ("struct of arrays") holding every product.
+    # Each product is a row: its name lives in an interned list, its topic is a small
+    # integer code and both prices are doubles in compact arrays, so the catalog costs a
+    # few bytes per product instead of a full object with a __dict__.
+    # The index maps every normalized name to its row. Dicts keep insertion order, so
+    # iterating still gives the products in the order they were created, while
+    # checks/lookups/deletes are O(1)
+    COMPACT_MIN_DEAD = 1024
+
+    def __init__(self):
+        self._index = {}
+        self._names = []
+        self._topic_codes = array("H")
+        self._notax = array("d")
+        self._prices = array("d")
+        # Topic code -> topic name, and back
+        self._topic_table = []
+        self._topic_lookup = {}
+        # Deleted rows are only tombstoned (name set to None) and get dropped in bulk by compact(),
+        # which moves the rows; Product views notice and look their row up again
+        self._dead = 0
+        # Topic code -> rows with that topic, built on first use by topic_rows()
+        self._rows_by_topic = None
+        # Callbacks called as callback(event, names) whenever products are added ("add"),
+        # removed ("remove"), get a new price ("reprice") or the whole catalog is replaced ("reset", names=None)
+        self._listeners = []
+
+    def __iter__(self):
+        view = Product._view
+        for name, row in self._index.items():
+            yield view(name, row)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __bool__(self):
+        return bool(self._index)
+
+    def __contains__(self, name):
+        return normalize_name(name) in self._index
+
+    def get(self, name, default=None):
+        name = normalize_name(name)
+        row = self._index.get(name)
+        if row is None:
+            return default
+        return Product._view(self._names[row], row)
+
+    def row(self, name):
+        # (name, topic, notax_price, price) of one product straight from the columns, like rows() does,
+        # or None if it doesn't exist
+        row = self._index.get(normalize_name(name))
+        if row is None:
+            return None
+        return self._names[row], self._topic_table[self._topic_codes[row]], self._notax[row], self._prices[row]
+
+    def names(self):
+        return self._index.keys()
+
+    def topic_code(self, topic):
+        code = self._topic_lookup.get(topic)
+        if code is None:
+            code = len(self._topic_table)
+            self._topic_table.append(topic)
+            self._topic_lookup[topic] = code
+        return code
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        self._listeners.remove(callback)
+
+    def _notify(self, event, names):
+        for callback in self._listeners:
+            callback(event, names)
+        # Only once the listeners (e.g. the search index) are up to date, otherwise a search
+        # could cache its old results under the new generation
+        touch_catalog()
+
+    def append(self, name, topic_code, notax_price, price):
+        # 'name' must already be normalized and not in the registry
+        name = sys.intern(name)
+        row = len(self._names)
+        self._names.append(name)
+        self._topic_codes.append(topic_code)
+        self._notax.append(notax_price)
+        self._prices.append(price)
+        self._index[name] = row
+        if self._rows_by_topic is not None:
+            self._rows_by_topic.setdefault(topic_code, array("I")).append(row)
+        self._notify("add", (name,))
+        return row
+
+    def extend(self, names, topic_codes, notax_prices, prices):
+        # Same as append() for whole columns, returns the row of the first new product
+        first = len(self._names)
+        names = [sys.intern(name) for name in names]
+        self._names.extend(names)
+        self._topic_codes.extend(topic_codes)
+        self._notax.extend(notax_prices)
+        self._prices.extend(prices)
+        self._index.update(zip(names, range(first, first + len(names))))
+        if self._rows_by_topic is not None:
+            for row, code in enumerate(topic_codes, first):
+                self._rows_by_topic.setdefault(code, array("I")).append(row)
+        if names:
+            self._notify("add", names)
+        return first
+
+    def remove(self, name):
+        # Returns False if the product didn't exist
+        name = normalize_name(name)
+        row = self._index.pop(name, None)
+        if row is None:
+            return False
+        self._names[row] = None
+        self._dead += 1
+        self._notify("remove", (name,))
+        if self._dead >= self.COMPACT_MIN_DEAD and self._dead > len(self._index):
+            self.compact()
+        return True
+
+    def remove_many(self, names):
+        # Removes all the given products in one go (listeners get a single "remove" event
+        # and the registry is compacted at most once). Returns the names that were removed
+        removed = []
+        index, column = self._index, self._names
+        for name in names:
+            name = normalize_name(name)
+            row = index.pop(name, None)
+            if row is not None:
+                column[row] = None
+                removed.append(name)
+        if removed:
+            self._dead += len(removed)
+            self._notify("remove", removed)
+            if self._dead >= self.COMPACT_MIN_DEAD and self._dead > len(self._index):
+                self.compact()
+        return removed
+
+    def compact(self):
+        # Drops the tombstoned rows, keeping the remaining ones in the same order
+        live = list(self._index.values())
+        self._names = [self._names[row] for row in live]
+        self._topic_codes = array("H", [self._topic_codes[row] for row in live])
+        self._notax = array("d", [self._notax[row] for row in live])
+        self._prices = array("d", [self._prices[row] for row in live])
+        self._index = {name: row for row, name in enumerate(self._names)}
+        self._rows_by_topic = None
+        self._dead = 0
+
+    def _replace_columns(self, names, topic_codes, notax, prices, topic_table):
+        # Swaps the whole catalog for the given columns (used when loading snapshots)
+        self._names = names
+        self._topic_codes = topic_codes
+        self._notax = notax
+        self._prices = prices
+        self._topic_table = list(topic_table)
+        self._topic_lookup = {topic: code for code, topic in enumerate(self._topic_table)}
+        self._index = dict(zip(names, range(len(names))))
+        self._rows_by_topic = None
+        self._dead = 0
+        self._notify("reset", None)
+
+    def topic_rows(self, topic):
+        # Rows of the products with that topic, in creation order
+        code = self._topic_lookup.get(topic)
+        if code is None:
+            return []
+        if self._rows_by_topic is None:
+            rows_by_topic = {}
+            for row, topic_code in enumerate(self._topic_codes):
+                rows_by_topic.setdefault(topic_code, array("I")).append(row)
+            self._rows_by_topic = rows_by_topic
+        names = self._names
+        return [row for row in self._rows_by_topic.get(code, ()) if names[row] is not None]
+
+    def reprice(self, rows, prices):
+        # Sets new taxed prices for the given rows
+        for row, price in zip(rows, prices):
+            self._prices[row] = price
+        self._notify("reprice", [self._names[row] for row in rows])
+
+    def rows(self):
+        # Fast whole-catalog scan: yields (name, topic, notax_price, price) tuples
+        # straight from the columns, without creating any Product
+        codes, notax, prices = self._topic_codes, self._notax, self._prices
+        table = self._topic_table
+        for name, row in self._index.items():
+            yield name, table[codes[row]], notax[row], prices[row]
+
+    def columns(self):
+        # The live columns for whole-catalog batch work: (names, topic_codes, notax_prices, prices, topic_table),
+        # indexed by row. Rows of deleted products still hold their values but have None as name.
+        # They're read-only views, change products through the registry instead
+        return self._names, self._topic_codes, self._notax, self._prices, self._topic_table
+
+    def clear(self):
+        self._replace_columns([], array("H"), array("d"), array("d"), [])
+
 class Product:
-    _instances = []
+    # A Product is only a light view over one row of the registry's columns.
+    # Views of the same product compare equal, but they don't hold any data themselves.
+    # A view follows its name: once the product is deleted reading it raises LookupError
+    # (its repr just says it was deleted), and if a product with that name is created again
+    # the view shows the new one. This doesn't depend on when the registry gets compacted
+    __slots__ = ("_name", "_row")
+    _instances = ProductRegistry()
 
     def __init__(self, name, topic, price):
+        registry = Product._instances
         # The titled name is used to mantain visual consistency
-        self.name = name.title()
+        name = normalize_name(name)
         # But topic is always lowercase for easier reference
         topic = topic.lower()
 
-        if any(p.name == self.name for p in Product._instances):
-            raise ValueError(f"Product '{self.name}' already exists.")
+        if name in registry.names():
+            if _stats_enabled:
+                add_count("product.duplicates")
+            raise ValueError(f"Product '{name}' already exists.")
 
         if topic not in topics:
             print(f"Topic '{topic}' not found. Using default.")
-            self.topic = "default"
-        else:
-            self.topic = topic
+            topic = "default"
 
         if not isinstance(price, (int, float)):
             raise ValueError("Price must be a number")
-        else:
-            self.notax_price = price
 
         # Calculates final taxed price, rounded to 2 decimals
-        self.price = round(apply_taxes(self.topic, self.notax_price), 2)
-        # Adds a reference for the object for further use
-        self._instances.append(self)
+        taxed = round(apply_taxes(topic, price), 2)
+        # Adds the product to the registry for further use
+        self._row = registry.append(name, registry.topic_code(topic), price, taxed)
+        self._name = registry._names[self._row]
+        if _stats_enabled:
+            add_count("product.created")
 
-    # The list 'instances' will contain references to all the products
+    @classmethod
+    def _view(cls, name, row):
+        view = cls.__new__(cls)
+        view._name = name
+        view._row = row
+        return view
+
+    def _resolve(self):
+        # The row is checked on every access: it may have been deleted (tombstoned with None)
+        # or moved by a compaction. Names are interned, so the check is an identity test
+        registry = Product._instances
+        names, row = registry._names, self._row
+        if row >= len(names) or names[row] is not self._name:
+            row = registry._index.get(self._name)
+            if row is None:
+                raise LookupError(f"Product '{self._name}' no longer exists")
+            self._row = row
+        return row
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def topic(self):
+        registry = Product._instances
+        return registry._topic_table[registry._topic_codes[self._resolve()]]
+
+    @property
+    def notax_price(self):
+        return Product._instances._notax[self._resolve()]
+
+    @property
+    def price(self):
+        return Product._instances._prices[self._resolve()]
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return self._name == other._name
+
+    def __hash__(self):
+        return hash(self._name)
+
+    def __repr__(self):
+        try:
+            return f"Product({self._name!r}, {self.topic!r}, {self.notax_price!r})"
+        except LookupError:
+            return f"Product({self._name!r}, deleted)"
+
+    # The registry 'instances' will contain all the products
     @classmethod
     def get_instances(cls):
         return cls._instances
 
+def create_many(names, product_topics, prices, skip_existing=False, rejects=None):
+    # Creates a whole batch of products from three columns (names, topics, prices).
+    # Every row is validated before anything is created, so a bad row leaves the registry untouched.
+    # With skip_existing=True names that already exist are skipped instead of raising.
+    # Products with unknown topics get 'default'; they're counted in 'rejects' (a RejectLog)
+    # if given, otherwise a message is printed
+    if not len(names) == len(product_topics) == len(prices):
+        raise ValueError("names, topics and prices must have the same length")
+
+    registry = Product.get_instances()
+    existing = registry.names()
+    default_code = registry.topic_code("default")
+
+    new_names, codes, bases = [], [], []
+    seen = set()
+    unknown_topics = 0
+    skipped = 0
+    with timed("create_many.validate"):
+        for name, topic, price in zip(names, product_topics, prices):
+            if not isinstance(name, str) or not isinstance(topic, str):
+                raise ValueError("Names and topics must be strings")
+            name = normalize_name(name)
+            if name in existing or name in seen:
+                if skip_existing:
+                    skipped += 1
+                    continue
+                raise ValueError(f"Product '{name}' already exists.")
+            if not isinstance(price, (int, float)):
+                raise ValueError("Price must be a number")
+
+            topic = topic.lower()
+            if topic in topics:
+                code = registry.topic_code(topic)
+            else:
+                unknown_topics += 1
+                if rejects is not None:
+                    rejects.add("unknown_topic", name=name, topic=topic)
+                code = default_code
+            seen.add(name)
+            new_names.append(name)
+            codes.append(code)
+            bases.append(price)
+
+    if unknown_topics and rejects is None:
+        print(f"{unknown_topics} product/s with unknown topics. Using default.")
+
+    with timed("create_many.taxes"):
+        # Same factor apply_taxes() uses, computed once per topic instead of once per product
+        multipliers = [1 + topics[topic] / 100 for topic in registry._topic_table]
+        numpy = get_numpy()
+        if numpy is not None:
+            taxed = (numpy.asarray(bases, dtype=numpy.float64)
+                     * numpy.asarray(multipliers)[numpy.asarray(codes, dtype=numpy.intp)]).tolist()
+        else:
+            taxed = [base * multipliers[code] for base, code in zip(bases, codes)]
+        # Python's round() on the same float keeps the result identical to Product.price
+        taxed = [round(price, 2) for price in taxed]
+
+    with timed("create_many.store"):
+        first = registry.extend(new_names, codes, bases, taxed)
+    if _stats_enabled:
+        add_count("product.created", len(new_names))
+        add_count("product.duplicates", skipped)
+        add_count("taxes.applied", len(new_names))
+    view, names = Product._view, registry._names
+    return [view(names[row], row) for row in range(first, first + len(new_names))]
+
 def delete_products(name: str) -> bool:
-    product_list = Product.get_instances()
-    # Deletes the reference of the product in the 'instances' list
-    for product in product_list:
-        if name.capitalize() == product.name:
-            product_list.remove(product)
-            return True
+    # Deletes the product from the 'instances' registry
     # If the product isn't found False will be returned
-    return False
+    removed = Product.get_instances().remove(name)
+    if removed and _stats_enabled:
+        add_count("product.deleted")
+    return removed
+
+@instrumented("delete.many")
+def delete_products_many(names):
+    # Deletes all the given products in a single pass over the registry (and its indexes).
+    # Returns two sets: the names that were deleted and the ones that weren't found, both normalized
+    names = [normalize_name(name) for name in names]
+    deleted = set(Product.get_instances().remove_many(names))
+    add_count("product.deleted", len(deleted))
+    not_found = set(names) - deleted
+    return deleted, not_found
+
+# ------ QUERIES ------
+class _SortedPrices:
+    # Product names kept sorted by taxed price (ties sorted by name), for bisect range lookups
+    def __init__(self):
+        self.prices = array("d")
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def _position(self, price, name):
+        # Products with the same price are sorted by name, so both can be found with bisect
+        start = bisect.bisect_left(self.prices, price)
+        end = bisect.bisect_right(self.prices, price, start)
+        return bisect.bisect_left(self.names, name, start, end)
+
+    def insert(self, price, name):
+        position = self._position(price, name)
+        self.prices.insert(position, price)
+        self.names.insert(position, name)
+
+    def remove(self, price, name):
+        position = self._position(price, name)
+        if position < len(self.names) and self.names[position] == name:
+            del self.prices[position]
+            del self.names[position]
+
+    def bounds(self, min_price=None, max_price=None):
+        start = 0 if min_price is None else bisect.bisect_left(self.prices, min_price)
+        end = len(self.prices) if max_price is None else bisect.bisect_right(self.prices, max_price)
+        return start, max(start, end)
+
+class ProductQueryIndex:
+    # Secondary indexes used by query(): every product sorted by taxed price, and the
+    # same per topic. Like the search index, it's built on first use and then follows the registry
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else Product.get_instances()
+        self._by_price = _SortedPrices()
+        self._by_topic = {}
+        # name -> (price, topic), to find the product again once it's deleted from the registry
+        self._entries = {}
+        self._stale = True
+        self._lock = threading.RLock()
+        self.registry.subscribe(self._on_change)
+
+    def _on_change(self, event, names):
+        with self._lock:
+            if self._stale:
+                return
+            if event == "reset" or len(names) > max(64, len(self._entries) // 8):
+                # Sorting everything again is cheaper than moving this many products
+                self._stale = True
+            elif event == "add":
+                for name in names:
+                    self._add(name)
+            elif event == "remove":
+                for name in names:
+                    self._remove(name)
+            else:
+                for name in names:
+                    self._remove(name)
+                    self._add(name)
+
+    def _add(self, name):
+        registry = self.registry
+        row = registry._index.get(name)
+        if row is None or name in self._entries:
+            return
+        price = registry._prices[row]
+        topic = registry._topic_table[registry._topic_codes[row]]
+        self._entries[name] = (price, topic)
+        self._by_price.insert(price, name)
+        by_topic = self._by_topic.get(topic)
+        if by_topic is None:
+            by_topic = self._by_topic[topic] = _SortedPrices()
+        by_topic.insert(price, name)
+
+    def _remove(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return
+        price, topic = entry
+        self._by_price.remove(price, name)
+        self._by_topic[topic].remove(price, name)
 
-def import_prd_from_json(filename="products.json"):
+    def rebuild(self):
+        with self._lock:
+            # Sorting everything at once is much faster than inserting one by one
+            rows = sorted((price, name, topic) for name, topic, _, price in self.registry.rows())
+            self._by_price = _SortedPrices()
+            self._by_topic = {}
+            self._entries = {}
+            for price, name, topic in rows:
+                self._entries[name] = (price, topic)
+                self._by_price.prices.append(price)
+                self._by_price.names.append(name)
+                by_topic = self._by_topic.get(topic)
+                if by_topic is None:
+                    by_topic = self._by_topic[topic] = _SortedPrices()
+                by_topic.prices.append(price)
+                by_topic.names.append(name)
+            self._stale = False
+
+    def query(self, topic=None, min_price=None, max_price=None, order_by=None, limit=None):
+        if order_by not in (None, "price", "-price", "name", "-name"):
+            raise ValueError("order_by must be 'price', '-price', 'name', '-name' or None")
+        with self._lock:
+            if self._stale:
+                self.rebuild()
+            if topic is None:
+                sorted_prices = self._by_price
+            else:
+                sorted_prices = self._by_topic.get(topic.lower())
+                if sorted_prices is None:
+                    return []
+            start, end = sorted_prices.bounds(min_price, max_price)
+
+            # Already in price order, so with a limit only the needed names are taken
+            if order_by == "price":
+                if limit is not None:
+                    end = min(end, start + limit)
+                return sorted_prices.names[start:end]
+            if order_by == "-price":
+                if limit is not None:
+                    start = max(start, end - limit)
+                return sorted_prices.names[start:end][::-1]
+            names = sorted_prices.names[start:end]
+
+        if order_by is None:
+            # Creation order
+            index = self.registry._index
+            names.sort(key=lambda name: index.get(name, -1))
+        else:
+            names.sort(reverse=order_by == "-name")
+        return names if limit is None else names[:limit]
+
+_query_index = None
+
+def get_query_index():
+    # The shared query index over Product.get_instances(), created on first use
+    global _query_index
+    if _query_index is None:
+        _query_index = ProductQueryIndex()
+    return _query_index
+
+def query(topic=None, min_price=None, max_price=None, order_by=None, limit=None):
+    # Returns the products of 'topic' (any topic if None) whose taxed price is between
+    # min_price and max_price (both included, no bound if None).
+    # order_by can be "price", "-price", "name", "-name" or None for creation order
+    registry = Product.get_instances()
+    names = get_query_index().query(topic, min_price, max_price, order_by, limit)
+    return [registry.get(name) for name in names]
+
+# Characters that can continue a JSON number
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+# A cut literal or escape ('tru', '\\u00') fails this close to the end of the buffer
+_MAX_TOKEN_CUT = 6
+
+def iter_json_array(f, chunk_size=1 << 16):
+    # Parses a top level JSON array from a binary file one element at a time,
+    # so only the current chunk is ever kept in memory.
+    # Yields (item, bytes_read) tuples and raises json.JSONDecodeError for invalid files
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    bytes_read = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, bytes_read, eof
+        chunk = f.read(chunk_size)
+        bytes_read += len(chunk)
+        eof = not chunk
+        # Drops what was already parsed before appending the new chunk
+        buf = buf[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\n\r":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    fill()
+    if buf.startswith("\ufeff"):
+        pos = 1
+    skip_whitespace()
+    if buf[pos:pos + 1] != "[":
+        raise json.JSONDecodeError("Expecting '['", buf, pos)
+    pos += 1
+
+    skip_whitespace()
+    if buf[pos:pos + 1] == "]":
+        return
+    while True:
+        skip_whitespace()
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            # A number touching the end of the buffer may continue in the next chunk,
+            # also when the chunk stopped right after its '.', 'e' or sign
+            complete = eof or not (isinstance(item, (int, float)) and not isinstance(item, bool)
+                                   and all(char in _NUMBER_CHARS for char in buf[end:]))
+        except json.JSONDecodeError as error:
+            # Only an item cut by the end of the buffer is worth reading more for,
+            # any other error is a real one and is raised right away
+            if eof or not (error.msg.startswith("Unterminated string") or error.pos >= len(buf) - _MAX_TOKEN_CUT):
+                raise
+            complete = False
+        if not complete:
+            fill()
+            continue
+        pos = end
+        yield item, bytes_read
+
+        skip_whitespace()
+        separator = buf[pos:pos + 1]
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos - 1)
+
+def check_product_item(item):
+    # Returns (name, topic, price) if the item looks like an exported product,
+    # or (None, reason) if it doesn't
+    if not isinstance(item, dict) or not all(k in item for k in ("name", "topic", "price")):
+        return None, "missing"
+    name, topic = item["name"], item["topic"]
     try:
-        with open(filename, "r") as f:
-            data = json.load(f)
+        if not isinstance(name, str) or not isinstance(topic, str):
+            raise TypeError
+        price = float(item["price"])
+    except (ValueError, TypeError):
+        return None, "invalid"
+    return (name, topic, price), None
+
+class OperationCancelled(Exception):
+    # Raised by imports/exports stopped through their 'cancel' event
+    pass
+
+class RejectLog:
+    # Collects the items an import rejects without doing any I/O per item: only a count
+    # per reason ("missing", "invalid", "duplicate") and the first few examples of each are kept.
+    # Products imported with the 'default' topic because theirs doesn't exist are counted
+    # the same way ("unknown_topic"), but they aren't rejects.
+    # summarize() logs the counts at most once every 'interval' seconds, and write()
+    # saves the whole report as .json once the import is over
+    MAX_SAMPLES = 5
+    NOT_REJECTED = frozenset({"unknown_topic"})
+
+    def __init__(self, source, interval=5.0):
+        self.source = source
+        self.interval = interval
+        self.counts = {}
+        self.samples = {}
+        self._last_summary = time.monotonic()
+        self._summarized = {}
+
+    def add(self, reason, position=None, name=None, **details):
+        count = self.counts.get(reason, 0)
+        self.counts[reason] = count + 1
+        if count < self.MAX_SAMPLES:
+            self.samples.setdefault(reason, []).append({"position": position, "name": name, **details})
+
+    def merge(self, other):
+        # Adds the rejects of another file, its samples keep the file they came from
+        for reason, count in other.counts.items():
+            self.counts[reason] = self.counts.get(reason, 0) + count
+            samples = self.samples.setdefault(reason, [])
+            samples.extend(dict(sample, file=other.source)
+                           for sample in other.samples.get(reason, [])[:self.MAX_SAMPLES - len(samples)])
+
+    def __len__(self):
+        # How many items were rejected
+        return sum(count for reason, count in self.counts.items() if reason not in self.NOT_REJECTED)
+
+    def summarize(self, final=False):
+        # One aggregated log line, skipped if nothing changed or the last one was too recent
+        now = time.monotonic()
+        if self.counts == self._summarized or (not final and now - self._last_summary < self.interval):
+            return
+        self._last_summary = now
+        self._summarized = dict(self.counts)
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(self.counts.items()))
+        get_logger().warning("%s: %d item/s rejected%s (%s)", self.source, len(self), "" if final else " so far", reasons)
+
+    def finish(self, reject_report=None):
+        # The one summary of an import: a line per kind of problem, the log and the report file
+        if reject_report:
+            self.write(reject_report)
+        if not self.counts:
+            return
+        broken = len(self) - self.counts.get("duplicate", 0)
+        if broken:
+            print(f"{broken} broken product/s found while importing {self.source}")
+        if self.counts.get("duplicate"):
+            print(f"{self.counts['duplicate']} product/s skipped while importing {self.source}; They already exist")
+        if self.counts.get("unknown_topic"):
+            print(f"{self.counts['unknown_topic']} product/s with unknown topics while importing {self.source}. "
+                  "Using default.")
+        self.summarize(final=True)
+
+    def report(self):
+        return {"source": self.source, "rejected": len(self),
+                "reasons": {reason: {"count": count, "samples": self.samples.get(reason, [])}
+                            for reason, count in sorted(self.counts.items())}}
+
+    def write(self, filename):
+        with atomic_write(filename) as f:
+            json.dump(self.report(), f, indent=4)
+
+@instrumented("import.total")
+def import_prd_from_json(filename="products.json", stream=False, batch_size=10000, progress=None, cancel=None,
+                         reject_report=None, rejects=None):
+    # With stream=True the file is parsed one product at a time instead of loading it whole.
+    # The valid products are committed to the registry every 'batch_size' parsed items,
+    # and 'progress(items_parsed, bytes_read, rejects)' is called after each batch.
+    # 'cancel' is a threading.Event checked between batches: once it's set, OperationCancelled
+    # is raised and only the batches committed until then stay imported.
+    # Broken and skipped items are counted by reason and summarized once at the end
+    # (see RejectLog), with a .json report written to 'reject_report' if given.
+    # Pass your own RejectLog as 'rejects' to look at the counts afterwards
+    try:
+        f = open(filename, "rb")
     except FileNotFoundError:
-        logging.error("Couldn't find the file: %s", filename)
-        return False
-    except json.JSONDecodeError:
-        logging.error("Couldn't read the file (Make sure it's an exported JSON): %s", filename)
+        get_logger().error("Couldn't find the file: %s", filename)
         return False
 
     broken = 0
-    names = {product.name for product in Product.get_instances()}
-    # The set 'names' is used to check if the product being imported already exists.
-    for item in data:
-        item_name = item.get('name', '?')
-        
-        # First it checks if there's something missing in the product
-        if not all(k in item for k in ("name", "topic", "price")):
-            logging.warning(f"[!] Some items of the product '{item_name}' were missing")
-            print(f"[!] Some items of the product '{item_name}' were missing")
-            broken += 1
-            continue
-        
-        # Then it checks if it already exists with the set 'names'
-        if item["name"] in names:
-            print(f"Product '{item['name']}' skipped; It already exists")
-            continue
-        
-        try:
-            price = float(item["price"])
-            Product(item["name"], item["topic"], price)
-        # If the product doesn't have the correct type on its parameters it won't be imported
-        except (ValueError, TypeError):
-            print(f"[!] Make sure the product was correctly exported '{item_name}'")
-            logging.warning(f"[!] Make sure the product was correctly exported '{item_name}'")
-            broken += 1
-    if broken > 0:
-        print(f"{broken} broken product/s found while importing {filename}")
-        logging.warning(f"{broken} broken product/s found while importing {filename}")
-        
+    parsed = 0
+    bytes_read = 0
+    if rejects is None:
+        rejects = RejectLog(filename)
+    registry = Product.get_instances()
+    # The registry and the 'pending' set are used to check if the product being imported already exists.
+    pending = set()
+    batch_names, batch_topics, batch_prices = [], [], []
+
+    def commit():
+        with timed("import.commit"):
+            create_many(batch_names, batch_topics, batch_prices, skip_existing=True, rejects=rejects)
+        batch_names.clear()
+        batch_topics.clear()
+        batch_prices.clear()
+        pending.clear()
+        rejects.summarize()
+        if progress is not None:
+            progress(parsed, bytes_read, broken)
+        if cancel is not None and cancel.is_set():
+            raise OperationCancelled(f"Import of {filename} cancelled")
+
+    try:
+        with f:
+            if stream:
+                items = iter_json_array(f)
+            else:
+                with timed("import.read"):
+                    data = json.loads(f.read())
+                bytes_read = f.tell()
+                items = ((item, bytes_read) for item in data)
+
+            for item, bytes_read in items:
+                # Batches go by parsed items, not accepted ones, so progress and cancel
+                # keep working on files made mostly of duplicates or broken products
+                if parsed and parsed % batch_size == 0:
+                    commit()
+                parsed += 1
+                fields, problem = check_product_item(item)
+
+                # First it checks if there's something missing in the product ("missing"),
+                # or if its parameters don't have the correct type ("invalid")
+                if problem:
+                    rejects.add(problem, parsed - 1, item.get("name") if isinstance(item, dict) else None)
+                    broken += 1
+                    continue
+
+                # Then it checks if it already exists
+                name, topic, price = fields
+                key = normalize_name(name)
+                if key in registry.names() or key in pending:
+                    rejects.add("duplicate", parsed - 1, name)
+                    continue
+
+                pending.add(key)
+                batch_names.append(name)
+                batch_topics.append(topic)
+                batch_prices.append(price)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        # In stream mode the batches before the error stay imported
+        get_logger().error("Couldn't read the file (Make sure it's an exported JSON): %s", filename)
+        return False
+    else:
+        commit()
+    finally:
+        # Even if the import failed or was cancelled, what was rejected until then is reported
+        rejects.finish(reject_report)
+    if _stats_enabled:
+        add_count("import.items", parsed)
+        add_count("import.bytes", bytes_read)
+        add_count("import.broken", broken)
+        add_count("import.skipped", rejects.counts.get("duplicate", 0))
+
     return True
 
-def export_prd_to_json(filename="products.json"):
-    data = []
+def _parse_shard(filename):
+    # Runs on a worker process: parses and validates one .json file and sends back only
+    # the valid products as three compact columns, plus the RejectLog of the broken ones
+    rejects = RejectLog(filename)
+    shard = {"file": filename, "names": [], "topics": [], "prices": [], "items": 0, "broken": 0, "error": None,
+             "rejects": rejects}
+    try:
+        with open(filename, "rb") as f:
+            for item, _ in iter_json_array(f):
+                shard["items"] += 1
+                fields, problem = check_product_item(item)
+                if problem:
+                    rejects.add(problem, shard["items"] - 1, item.get("name") if isinstance(item, dict) else None)
+                    shard["broken"] += 1
+                    continue
+                name, topic, price = fields
+                shard["names"].append(normalize_name(name))
+                shard["topics"].append(topic.lower())
+                shard["prices"].append(price)
+    except FileNotFoundError:
+        shard["error"] = "not found"
+    except OSError as error:
+        # A directory, no permission to read it, a read error... the file fails without stopping the others
+        shard["error"] = (error.strerror or str(error)).lower()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        shard["error"] = "invalid json"
+    return shard
 
-    # Takes all the current products and exports them to a .json
-    for product in Product.get_instances():
-        data.append({
-            "name": product.name,
-            "topic": product.topic,
-            "price": product.notax_price
-        })
-    with open(filename, "w") as f:
-        json.dump(data, f, indent=4)
+@instrumented("import_many.total")
+def import_many(filenames, workers=None, reject_report=None):
+    # Imports several .json files at once, parsing them in parallel on 'workers' processes
+    # (all the CPUs by default) and adding the products here, in the order the files were given.
+    # If a name appears more than once, the first file (and first item in it) wins.
+    # Returns a report with the totals and the results of every file; the rejected items
+    # of all the files are summarized once at the end, like import_prd_from_json() does
+    filenames = list(filenames)
+    report = {"imported": 0, "skipped": 0, "broken": 0, "failed": [], "files": {}}
+    if not filenames:
+        return report
+
+    if workers == 1 or len(filenames) == 1:
+        shards = map(_parse_shard, filenames)
+        executor = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+        shards = executor.map(_parse_shard, filenames)
+
+    registry = Product.get_instances()
+    existing = registry.names()
+    # A short label for the summary, the samples say which file they come from
+    rejects = RejectLog(f"{len(filenames)} file/s")
+    try:
+        for shard in shards:
+            filename = shard["file"]
+            if shard["error"]:
+                get_logger().error("Couldn't import the file (%s): %s", shard["error"], filename)
+                report["failed"].append(filename)
+
+            names, product_topics, prices = [], [], []
+            seen = set()
+            skipped = 0
+            for name, topic, price in zip(shard["names"], shard["topics"], shard["prices"]):
+                if name in existing or name in seen:
+                    shard["rejects"].add("duplicate", None, name)
+                    skipped += 1
+                    continue
+                seen.add(name)
+                names.append(name)
+                product_topics.append(topic)
+                prices.append(price)
+            create_many(names, product_topics, prices, skip_existing=True, rejects=shard["rejects"])
+
+            report["files"][filename] = {"items": shard["items"], "imported": len(names), "skipped": skipped,
+                                         "broken": shard["broken"], "error": shard["error"]}
+            report["imported"] += len(names)
+            report["skipped"] += skipped
+            report["broken"] += shard["broken"]
+            rejects.merge(shard["rejects"])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        rejects.finish(reject_report)
+    report["rejects"] = rejects.report()["reasons"]
+    return report
+
+@contextmanager
+def atomic_write(filename, binary=False):
+    # Writes to a temporary file next to 'filename' and renames it over the
+    # original only once everything was written, so readers never see a half-written file
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filename)}.", suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp() creates the file as private, keep the permissions a normal open() would give
+        mode = os.stat(filename).st_mode if os.path.exists(filename) else 0o644
+        os.chmod(tmp_path, mode & 0o7777)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+@instrumented("export.total")
+def export_prd_to_json(filename="products.json", compact=False, ndjson=False, chunk_size=1000,
+                       progress=None, cancel=None, rows=None):
+    # Writes all the current products to a .json straight from the registry, 'chunk_size' products at a time.
+    # By default the output is the same indented JSON list as always,
+    # compact=True drops the indentation and ndjson=True writes one product per line instead of a list.
+    # 'progress(items_written, bytes_written)' is called after each chunk, and once the 'cancel'
+    # event is set OperationCancelled is raised, leaving the original file untouched.
+    # 'rows' can be any iterable of (name, topic, notax_price, price) to export instead of the registry
+    if rows is None:
+        rows = Product.get_instances().rows()
+    with atomic_write(filename) as f:
+        if ndjson:
+            start, separator, end = "", "\n", "\n"
+            encode = json.JSONEncoder(separators=(",", ":")).encode
+        elif compact:
+            start, separator, end = "[", ",", "]"
+            encode = json.JSONEncoder(separators=(",", ":")).encode
+        else:
+            # Same layout json.dump(data, f, indent=4) gives
+            start, separator, end = "[\n    ", ",\n    ", "\n]"
+            item_encode = json.JSONEncoder(indent=4).encode
+            encode = lambda item: item_encode(item).replace("\n", "\n    ")
+
+        written = 0
+        bytes_written = 0
+        chunk = []
+
+        def write_chunk():
+            nonlocal written, bytes_written
+            data = (start if not written else separator) + separator.join(chunk)
+            with timed("export.write"):
+                f.write(data)
+            written += len(chunk)
+            # The encoders escape everything that isn't ASCII, so characters and bytes match
+            bytes_written += len(data)
+            chunk.clear()
+            if progress is not None:
+                progress(written, bytes_written)
+            if cancel is not None and cancel.is_set():
+                raise OperationCancelled(f"Export to {filename} cancelled")
+
+        for name, topic, notax_price, _ in rows:
+            chunk.append(encode({"name": name, "topic": topic, "price": notax_price}))
+            if len(chunk) >= chunk_size:
+                write_chunk()
+        if chunk:
+            write_chunk()
 
+        if written:
+            f.write(end)
+        elif not ndjson:
+            f.write("[]")
+    add_count("export.items", written)
+
+@instrumented("topics.import")
 def import_topics_json(filename="topics.json", preview=False):
     try:
         with open(filename, "r") as f:
@@ -188,12 +1250,13 @@ def import_topics_json(filename="topics.json", preview=False):
                     create_topic(name, percentage)
             return True
     except FileNotFoundError:
-        logging.error("Couldn't find the file: %s", filename)
+        get_logger().error("Couldn't find the file: %s", filename)
         return [] if preview else False
     except json.JSONDecodeError:
-        logging.error("Couldn't read the file (Make sure it's an exported JSON): %s", filename)
+        get_logger().error("Couldn't read the file (Make sure it's an exported JSON): %s", filename)
         return [] if preview else False
 
+@instrumented("topics.export")
 def export_topics_json(filename="topics.json", topics_to_export=None):
     # First, a list for the topics to export is created
     data = []
@@ -206,10 +1269,135 @@ def export_topics_json(filename="topics.json", topics_to_export=None):
         if not topics_to_export or name in topics_to_export:
             data.append({name: percentage})
 
-    with open(filename, "w") as f:
+    with atomic_write(filename) as f:
         json.dump(data, f, indent=4)
 
 
+# ------ SNAPSHOTS ------
+# Binary catalog format, every section is little endian and starts 8-byte aligned:
+#   header        magic, version, topic count, topic heap size, product count, name heap size
+#   topic table   taxes (float64) and end offsets of each topic name in the topic heap (uint64)
+#   columns       topic codes (uint16), base prices (float64), taxed prices (float64),
+#                 end offsets of each name in the name heap (uint64)
+#   heaps         UTF-8 topic names and product names, NUL separated
+SNAPSHOT_MAGIC = b"PPHS"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<4sHHIIQQ")
+
+def _little_endian(column):
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+def _padding(size):
+    return b"\0" * (-size % 8)
+
+def _heap(strings):
+    # Returns the NUL separated heap and the end offset of every string in it
+    ends = array("Q")
+    encoded = [string.encode("utf-8") for string in strings]
+    offset = 0
+    for data in encoded:
+        offset += len(data) + 1
+        ends.append(offset)
+    return b"\0".join(encoded) + (b"\0" if encoded else b""), ends
+
+@instrumented("snapshot.export")
+def export_snapshot(filename="catalog.snap"):
+    # Saves all products and topics into a binary snapshot that load_snapshot() can map back without parsing
+    registry = Product.get_instances()
+    if registry._dead:
+        registry.compact()
+
+    # The registry's topic codes stay valid, topics no product uses yet go at the end
+    topic_table = registry._topic_table + [topic for topic in topics if topic not in registry._topic_lookup]
+    taxes = array("d", [topics[topic] for topic in topic_table])
+    topic_heap, topic_ends = _heap(topic_table)
+    name_heap, name_ends = _heap(registry._names)
+
+    with atomic_write(filename, binary=True) as f:
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, len(topic_table),
+                                      len(topic_heap), len(registry._names), len(name_heap)))
+        for column in (taxes, topic_ends, registry._topic_codes, registry._notax, registry._prices, name_ends):
+            data = _little_endian(column).tobytes()
+            f.write(data + _padding(len(data)))
+        f.write(topic_heap + _padding(len(topic_heap)))
+        f.write(name_heap)
+
+@instrumented("snapshot.load")
+def load_snapshot(filename="catalog.snap"):
+    # Replaces the current products with the ones in the snapshot, and adds/updates its topics.
+    # The file is memory-mapped and the numeric columns copied as they are, without parsing them.
+    # This isn't lazy though: every name is still decoded, interned and indexed here, so loading
+    # takes time proportional to the products (about 2.5 s per million), only less than a .json.
+    # Product views are the only thing created when the products are accessed
+    try:
+        with open(filename, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        get_logger().error("Couldn't find the file: %s", filename)
+        return False
+    except ValueError:
+        # mmap() refuses empty files
+        get_logger().error("Couldn't read the file (Make sure it's an exported snapshot): %s", filename)
+        return False
+
+    with mapped:
+        view = memoryview(mapped)
+        try:
+            magic, version, _, topic_count, topic_heap_size, count, name_heap_size = \
+                _SNAPSHOT_HEADER.unpack_from(view)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError
+            offset = _SNAPSHOT_HEADER.size
+
+            def column(typecode, length):
+                nonlocal offset
+                data = array(typecode)
+                size = length * data.itemsize
+                if offset + size > len(view):
+                    raise ValueError
+                data.frombytes(view[offset:offset + size])
+                offset += size + (-size % 8)
+                return _little_endian(data)
+
+            def heap(size, ends):
+                nonlocal offset
+                raw = bytes(view[offset:offset + size])
+                offset += size + (-size % 8)
+                if len(raw) != size or (ends and ends[-1] != size):
+                    raise ValueError
+                strings = raw.decode("utf-8").split("\0")[:-1] if size else []
+                if len(strings) != len(ends):
+                    # Some string has a NUL inside, split by the offsets instead
+                    starts = [0] + list(ends[:-1])
+                    strings = [raw[a:b - 1].decode("utf-8") for a, b in zip(starts, ends)]
+                return strings
+
+            taxes = column("d", topic_count)
+            topic_ends = column("Q", topic_count)
+            topic_codes = column("H", count)
+            notax = column("d", count)
+            prices = column("d", count)
+            name_ends = column("Q", count)
+            topic_table = heap(topic_heap_size, topic_ends)
+            names = list(map(sys.intern, heap(name_heap_size, name_ends)))
+            if topic_codes and max(topic_codes) >= topic_count:
+                raise ValueError
+        except (ValueError, struct.error, UnicodeDecodeError):
+            get_logger().error("Couldn't read the file (Make sure it's an exported snapshot): %s", filename)
+            return False
+        finally:
+            view.release()
+
+    for topic, tax in zip(topic_table, taxes):
+        topics[topic] = int(tax) if tax.is_integer() else tax
+    touch_catalog()
+    Product.get_instances()._replace_columns(names, topic_codes, notax, prices, topic_table)
+    return True
+
+
 def chart(*args):
 
     # This is a simple chart for showing all the products in Args
@@ -1,11 +1,52 @@
 import products
+import searchindex
 
 import sys
 from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QVBoxLayout,
-                             QPushButton, QLineEdit, QMessageBox, QInputDialog)
-from PyQt5.QtCore import Qt
+                             QPushButton, QLineEdit, QListWidget)
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+
+class SearchSignals(QObject):
+    # (query id, chunk of product names)
+    results = pyqtSignal(int, list)
+    # (query id, total results, whether they come from the fuzzy search)
+    finished = pyqtSignal(int, int, bool)
+
+# Runs one query on a worker thread and sends the results back in chunks.
+# 'is_current(query_id)' tells if a newer query arrived, in which case it stops sending results
+class SearchWorker(QRunnable):
+    CHUNK_SIZE = 50
+
+    def __init__(self, query_id, query, limit, is_current):
+        super().__init__()
+        self.query_id = query_id
+        self.query = query
+        self.limit = limit
+        self.is_current = is_current
+        self.signals = SearchSignals()
+
+    def run(self):
+        if not self.is_current(self.query_id):
+            return
+        names = searchindex.search_names(self.query, self.limit)
+        fuzzy = False
+        if not names and self.is_current(self.query_id):
+            # If nothing contains the query, it may have a typo
+            names = [name for name, _ in searchindex.fuzzy_search_names(self.query, limit=self.limit)]
+            fuzzy = True
+
+        for start in range(0, len(names), self.CHUNK_SIZE):
+            if not self.is_current(self.query_id):
+                return
+            self.signals.results.emit(self.query_id, list(names[start:start + self.CHUNK_SIZE]))
+        self.signals.finished.emit(self.query_id, len(names), fuzzy)
 
 class Searcher(QWidget):
+    # Milliseconds to wait after the last keystroke before searching
+    DEBOUNCE_MS = 250
+    RESULTS_LIMIT = 500
+
     def __init__(self):
         super().__init__()
         self.title         = QLabel("Search for an Item...", self)
@@ -18,8 +59,21 @@ class Searcher(QWidget):
         self.item_notax_label = QLabel("Price without taxes: ...", self)
         self.item_topic_label = QLabel("Item Topic: ...", self)
         self.message_label = QLabel(self)
+        self.results_list = QListWidget(self)
+
+        # Every query gets a new id, results from older ones are ignored
+        self.query_id = 0
+        # Only one query runs at a time, and queued ones are dropped when a newer one arrives
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.DEBOUNCE_MS)
 
         self.search_button.clicked.connect(self.search)
+        self.search_box.textChanged.connect(self.debounce.start)
+        self.debounce.timeout.connect(self.search)
+        self.results_list.currentTextChanged.connect(self.show_product)
 
         self.initUI()
 
@@ -30,6 +84,7 @@ class Searcher(QWidget):
         vbox.addWidget(self.title)
         vbox.addWidget(self.search_box)
         vbox.addWidget(self.search_button)
+        vbox.addWidget(self.results_list)
         vbox.addWidget(self.item_name_label)
         vbox.addWidget(self.item_price_label)
         vbox.addWidget(self.item_notax_label)
@@ -37,6 +92,7 @@ class Searcher(QWidget):
         vbox.addWidget(self.message_label)
 
         self.search_button.setMinimumHeight(55)
+        self.results_list.setMinimumHeight(150)
 
         self.setLayout(vbox)
         self.title.setObjectName("title")
@@ -70,6 +126,9 @@ class Searcher(QWidget):
                 font-weight: bold;
                 background-color: hsl(206, 78%, 65%);
             }
+            QListWidget{
+                font-size: 20px;
+            }
             QLabel#item_name_label, QLabel#item_price_label, QLabel#item_topic_label, QLabel#item_notax_label{
                 background-color: hsl(140, 100%, 79%);
                 border-radius: 5px;
@@ -80,20 +139,52 @@ class Searcher(QWidget):
         self.message_label.setAlignment(Qt.AlignCenter)
 
     def search(self):
-        product_list = products.Product.get_instances()
-        found = False
-        for product in product_list:
-            if self.search_box.text().strip().lower() in product.name.lower():
-                self.search_box.setText("")
-                self.item_name_label.setText(f"Item Name: {product.name}")
-                self.item_price_label.setText(f"Item Price: ${product.price}")
-                self.item_notax_label.setText(f"Price without taxes: ${product.notax_price}")
-                self.item_topic_label.setText(f"Item Topic: {product.topic.capitalize()} ({products.topics[product.topic]}% tax)")
-                self.message_label.setText("")
-                found = True
-                break
-        if not found:
+        # Starts a new query on the worker thread, cancelling any older one
+        self.debounce.stop()
+        self.query_id += 1
+        self.pool.clear()
+        self.results_list.clear()
+
+        query = self.search_box.text()
+        if not query.strip():
+            self.message_label.setText("")
+            return
+        self.message_label.setText("Searching...")
+        worker = SearchWorker(self.query_id, query, self.RESULTS_LIMIT, self.is_current)
+        worker.signals.results.connect(self.add_results)
+        worker.signals.finished.connect(self.search_finished)
+        self.pool.start(worker)
+
+    def is_current(self, query_id):
+        return query_id == self.query_id
+
+    def add_results(self, query_id, names):
+        if self.is_current(query_id):
+            self.results_list.addItems(names)
+
+    def search_finished(self, query_id, total, fuzzy):
+        if not self.is_current(query_id):
+            return
+        if not total:
             self.message_label.setText("Product not found!")
+            return
+        # The best match is always the first one
+        self.results_list.setCurrentRow(0)
+        if fuzzy:
+            self.message_label.setText(f"Did you mean '{self.results_list.item(0).text()}'?")
+        elif total >= self.RESULTS_LIMIT:
+            self.message_label.setText(f"Showing the first {total} products found")
+        else:
+            self.message_label.setText(f"{total} product/s found")
+
+    def show_product(self, name):
+        product = products.Product.get_instances().get(name) if name else None
+        if product is None:
+            return
+        self.item_name_label.setText(f"Item Name: {product.name}")
+        self.item_price_label.setText(f"Item Price: ${product.price}")
+        self.item_notax_label.setText(f"Price without taxes: ${product.notax_price}")
+        self.item_topic_label.setText(f"Item Topic: {product.topic.capitalize()} ({products.topics[product.topic]}% tax)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+# searchindex.py
+# Trigram inverted index over the product names, used for substring and prefix searches.
+# It follows the product registry on its own, so it never has to be rebuilt by hand.
+
+import threading
+from array import array
+from collections import OrderedDict
+
+import products
+
+# Marks the start and end of every name, so prefix searches have their own trigrams
+START = "\x02"
+END = "\x03"
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def bounded_distance(a, b, max_distance):
+    # Optimal string alignment distance (Levenshtein plus swapping two adjacent letters).
+    # Only the band of cells that can stay within 'max_distance' is computed, and
+    # max_distance + 1 is returned as soon as every cell of a row goes over it
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    if a == b:
+        return 0
+
+    before = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        row_min = current[0]
+        char = a[i - 1]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (char != b[j - 1]))
+            if before is not None and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current[j] = min(distance, too_far)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return too_far
+        before, previous = previous, current
+    return previous[-1]
+
+class SearchIndex:
+    # Every indexed name gets an integer id. Each trigram points to the ids of the names
+    # containing it (its postings list), always in increasing id order, which is also the
+    # order the products were created in
+    REBUILD_MIN_DEAD = 1024
+    # Once this few candidates are left, checking them directly is cheaper than intersecting more postings
+    SMALL_CANDIDATES = 64
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else products.Product.get_instances()
+        self._ids = {}
+        self._names = []
+        self._lowered = []
+        self._postings = {}
+        self._by_length = {}
+        self._dead = 0
+        # The index is (re)built lazily on the first search after being created or reset
+        self._stale = True
+        # Searches may run on worker threads, so updates and rebuilds never overlap
+        self._lock = threading.RLock()
+        self.registry.subscribe(self._on_change)
+
+    def close(self):
+        self.registry.unsubscribe(self._on_change)
+
+    def _on_change(self, event, names):
+        with self._lock:
+            if self._stale:
+                return
+            if event == "add":
+                for name in names:
+                    self._add(name)
+            elif event == "remove":
+                for name in names:
+                    self._remove(name)
+            elif event == "reset":
+                self._stale = True
+
+    def _add(self, name):
+        if name in self._ids:
+            return
+        postings = self._postings
+        lowered = name.lower()
+        product_id = len(self._names)
+        self._ids[name] = product_id
+        self._names.append(name)
+        self._lowered.append(lowered)
+        for gram in trigrams(START + lowered + END):
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = array("I", (product_id,))
+            else:
+                ids.append(product_id)
+        ids = self._by_length.get(len(lowered))
+        if ids is None:
+            self._by_length[len(lowered)] = array("I", (product_id,))
+        else:
+            ids.append(product_id)
+
+    def _remove(self, name):
+        product_id = self._ids.pop(name, None)
+        if product_id is None:
+            return
+        # The id stays in the postings lists, searches just skip it
+        self._names[product_id] = None
+        self._lowered[product_id] = None
+        self._dead += 1
+        if self._dead >= self.REBUILD_MIN_DEAD and self._dead > len(self._ids):
+            self._stale = True
+
+    @products.instrumented("search.index_build")
+    def rebuild(self):
+        with self._lock:
+            self._ids = {}
+            self._names = []
+            self._lowered = []
+            self._postings = {}
+            self._by_length = {}
+            self._dead = 0
+            for name in list(self.registry.names()):
+                self._add(name)
+            self._stale = False
+
+    def _ensure_built(self):
+        if self._stale:
+            with self._lock:
+                if self._stale:
+                    self.rebuild()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _candidates(self, grams):
+        # Intersects the postings lists of 'grams', starting from the shortest one
+        lists = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            if len(candidates) <= self.SMALL_CANDIDATES:
+                break
+            candidates.intersection_update(ids)
+        return sorted(candidates)
+
+    @products.instrumented("search.substring")
+    def search(self, query, limit=None, prefix=False):
+        # Returns the names of all the products containing 'query' (case insensitive),
+        # exact matches first, then names starting with it, then the rest in creation order.
+        # With prefix=True only names starting with 'query' are returned.
+        # Searches hold the lock too, so they never see a half applied update
+        with self._lock:
+            return self._search(query, limit, prefix)
+
+    def _search(self, query, limit, prefix):
+        self._ensure_built()
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        grams = trigrams(START + query) if prefix else trigrams(query)
+        if grams:
+            candidates = self._candidates(grams)
+        else:
+            # Queries shorter than a trigram can only be checked one by one
+            candidates = range(len(self._lowered))
+
+        lowered = self._lowered
+        exact, starts, contains = [], [], []
+        for product_id in candidates:
+            name = lowered[product_id]
+            if name is None:
+                continue
+            if name == query:
+                exact.append(product_id)
+            elif name.startswith(query):
+                starts.append(product_id)
+            elif not prefix and query in name:
+                contains.append(product_id)
+
+        ranked = exact + starts + contains
+        if limit is not None:
+            ranked = ranked[:limit]
+        names = self._names
+        return [names[product_id] for product_id in ranked]
+
+    @products.instrumented("search.fuzzy")
+    def fuzzy_search(self, query, max_distance=2, limit=None):
+        # Returns (name, distance) for the products whose name is at most 'max_distance' typos
+        # away from 'query' (case insensitive), closest first.
+        # Candidates are the names sharing enough trigrams with the query: each typo can break
+        # at most 4 of them (3 for a wrong/missing/extra letter, 4 for two swapped letters),
+        # so only those are checked with bounded_distance()
+        with self._lock:
+            return self._fuzzy_search(query, max_distance, limit)
+
+    def _fuzzy_search(self, query, max_distance, limit):
+        self._ensure_built()
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        grams = trigrams(START + query + END)
+        min_shared = len(grams) - 4 * max_distance
+        shared = {}
+        for gram in grams:
+            for product_id in self._postings.get(gram, ()):
+                shared[product_id] = shared.get(product_id, 0) + 1
+        if min_shared < 1:
+            # Short queries can match without sharing any trigram,
+            # so every name of a close enough length is a candidate
+            for length in range(max(0, len(query) - max_distance), len(query) + max_distance + 1):
+                for product_id in self._by_length.get(length, ()):
+                    shared.setdefault(product_id, 0)
+
+        lowered = self._lowered
+        length = len(query)
+        matches = []
+        for product_id, count in shared.items():
+            name = lowered[product_id]
+            if count < min_shared or name is None or abs(len(name) - length) > max_distance:
+                continue
+            distance = bounded_distance(query, name, max_distance)
+            if distance <= max_distance:
+                # Ties go to the name sharing more trigrams, then to the oldest product
+                matches.append((distance, -count, product_id))
+
+        matches.sort()
+        if limit is not None:
+            matches = matches[:limit]
+        names = self._names
+        return [(names[product_id], distance) for distance, _, product_id in matches]
+
+class ResultCache:
+    # Bounded LRU cache for search results. Keys include products.catalog_generation(),
+    # so any change to the catalog makes the old entries unreachable (they just age out)
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        key = (products.catalog_generation(),) + key
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                products.add_count("search.cache_hits")
+                return self._entries[key]
+            self.misses += 1
+        products.add_count("search.cache_misses")
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+cache = ResultCache()
+
+_index = None
+
+def get_index():
+    # The shared index over Product.get_instances(), created on first use
+    global _index
+    if _index is None:
+        _index = SearchIndex()
+    return _index
+
+def search_names(query, limit=None, prefix=False):
+    # Cached SearchIndex.search() over the shared index.
+    # Results are tuples since the same one is given to every caller
+    query = query.strip().lower()
+    return cache.get_or_compute(("search", query, limit, prefix),
+                                lambda: tuple(get_index().search(query, limit, prefix)))
+
+def fuzzy_search_names(query, max_distance=2, limit=None):
+    # Cached SearchIndex.fuzzy_search() over the shared index
+    query = query.strip().lower()
+    return cache.get_or_compute(("fuzzy", query, max_distance, limit),
+                                lambda: tuple(get_index().fuzzy_search(query, max_distance, limit)))
+
+def search(query, limit=None, prefix=False):
+    # Same as search_names() but returning the Product objects
+    registry = products.Product.get_instances()
+    return [registry.get(name) for name in search_names(query, limit, prefix)]
+
+def fuzzy_search(query, max_distance=2, limit=None):
+    # Same as fuzzy_search_names() but returning (Product, distance) tuples
+    registry = products.Product.get_instances()
+    return [(registry.get(name), distance)
+            for name, distance in fuzzy_search_names(query, max_distance, limit)]
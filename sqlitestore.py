@@ -0,0 +1,361 @@
+# sqlitestore.py
+# Optional storage backend keeping products and topics in a local SQLite database instead of memory.
+# Nothing has to be rebuilt from JSON on start, several processes can read (and take turns writing)
+# the same catalog, and lookups, searches and price ranges run as indexed SQL queries.
+# The JSON files stay the interchange format: import_json()/export_json() read and write the same
+# files as products.import_prd_from_json()/export_prd_to_json(), and load()/save() move the
+# whole catalog between the database and the in-memory registry used by the GUI.
+
+import json
+import sqlite3
+import threading
+from collections import namedtuple
+
+import products
+
+# Same fields (and names) a Product has, so rows work with products.chart() too
+ProductRow = namedtuple("ProductRow", ("name", "topic", "notax_price", "price"))
+
+# The first 10 topics are the default ones
+DEFAULT_TOPICS = dict(list(products.topics.items())[:10])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    name TEXT PRIMARY KEY,
+    tax NUMERIC NOT NULL,
+    custom INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    name_lower TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    notax REAL NOT NULL,
+    price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_name_lower ON products (name_lower);
+CREATE INDEX IF NOT EXISTS products_topic_price ON products (topic, price, name);
+CREATE INDEX IF NOT EXISTS products_price ON products (price, name);
+"""
+
+ORDERS = {
+    None: "id",
+    "price": "price, name",
+    "-price": "price DESC, name DESC",
+    "name": "name",
+    "-name": "name DESC",
+}
+
+def _taxed(notax, tax):
+    # Same price a Product gets, so the database and the registry always agree
+    return round(notax * (1 + tax / 100), 2)
+
+def _prefix_end(prefix):
+    # Smallest string greater than every string starting with 'prefix', for index range scans
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+class SQLiteStore:
+    def __init__(self, path="products.db"):
+        self.path = path
+        # The GUI runs imports/exports on worker threads, writes share the connection in turns
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # Reads go through a connection per thread (see _read()), all of them are closed by close()
+        self._local = threading.local()
+        self._readers = []
+        # Not self._lock, that one is held by writers for whole transactions
+        self._readers_lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.create_function("taxed", 2, _taxed, deterministic=True)
+        with self._db:
+            self._db.executescript(SCHEMA)
+            self._db.executemany("INSERT OR IGNORE INTO topics (name, tax, custom) VALUES (?, ?, 0)",
+                                 DEFAULT_TOPICS.items())
+
+    def close(self):
+        with self._readers_lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+        self._db.close()
+
+    def _read(self, sql, params=()):
+        # Runs a read-only query and returns an iterator over its rows. Reading through the shared connection would run inside whatever
+        # transaction a writer has open (e.g. a long import_json) and see rows that may be rolled back,
+        # so every thread reads through a connection of its own, which with WAL sees the last
+        # committed catalog without waiting for the writer.
+        # In-memory databases can't be opened twice, their reads take the lock and are fetched at once
+        if self.path in (":memory:", ""):
+            with self._lock:
+                return iter(self._db.execute(sql, params).fetchall())
+        reader = getattr(self._local, "reader", None)
+        if reader is None:
+            reader = sqlite3.connect(self.path, check_same_thread=False)
+            with self._readers_lock:
+                self._readers.append(reader)
+            self._local.reader = reader
+        return reader.execute(sql, params)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ------ TOPICS ------
+    def topics(self):
+        # {name: tax}, default topics first like products.topics
+        return dict(self._read("SELECT name, tax FROM topics ORDER BY custom, rowid"))
+
+    def create_topic(self, name: str, tax) -> None:
+        if not name.isalpha():
+            raise ValueError("Topic name must be only letters (a-z)")
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("INSERT INTO topics (name, tax) VALUES (?, ?)", (name, tax))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Topic '{name}' already exists") from None
+
+    def update_topic_tax(self, name: str, tax) -> int:
+        # Changes the tax of a topic and reprices its products in the same transaction.
+        # Returns how many were repriced
+        if isinstance(tax, bool) or not isinstance(tax, (int, float)):
+            raise ValueError("Tax must be a number")
+        with self._lock, self._db:
+            if not self._db.execute("UPDATE topics SET tax = ? WHERE name = ?", (tax, name)).rowcount:
+                raise ValueError(f"Topic '{name}' doesn't exist")
+            return self._db.execute("UPDATE products SET price = taxed(notax, ?) WHERE topic = ?",
+                                    (tax, name)).rowcount
+
+    # ------ PRODUCTS ------
+    def __len__(self):
+        return next(self._read("SELECT count(*) FROM products"))[0]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def _insert(self, names, product_topics, prices, skip_existing, rejects=None):
+        # Validates and inserts a batch inside the caller's transaction. Returns how many were inserted.
+        # Products with unknown topics get 'default', and are counted in 'rejects' if given.
+        # The topics are read in that same transaction
+        taxes = dict(self._db.execute("SELECT name, tax FROM topics"))
+        rows = []
+        for name, topic, price in zip(names, product_topics, prices):
+            if not isinstance(name, str) or not isinstance(topic, str):
+                raise ValueError("Names and topics must be strings")
+            if isinstance(price, bool) or not isinstance(price, (int, float)):
+                raise ValueError("Price must be a number")
+            name = products.normalize_name(name)
+            topic = topic.lower()
+            if topic not in taxes:
+                if rejects is not None:
+                    rejects.add("unknown_topic", name=name, topic=topic)
+                topic = "default"
+            rows.append((name, name.lower(), topic, price, _taxed(price, taxes[topic])))
+
+        verb = "INSERT OR IGNORE" if skip_existing else "INSERT"
+        before = self._db.total_changes
+        try:
+            self._db.executemany(f"{verb} INTO products (name, name_lower, topic, notax, price) "
+                                 "VALUES (?, ?, ?, ?, ?)", rows)
+        except sqlite3.IntegrityError as error:
+            raise ValueError(f"Some product already exists ({error})") from None
+        return self._db.total_changes - before
+
+    @products.instrumented("sqlite.create_many")
+    def create_many(self, names, product_topics, prices, skip_existing=False) -> int:
+        # Same rules as products.create_many(), in a single transaction: if any row is wrong
+        # (or already exists, without skip_existing) nothing is created. Returns how many were created
+        if not len(names) == len(product_topics) == len(prices):
+            raise ValueError("names, topics and prices must have the same length")
+        with self._lock, self._db:
+            return self._insert(names, product_topics, prices, skip_existing)
+
+    def create(self, name, topic, price):
+        return self.create_many([name], [topic], [price])
+
+    def get(self, name):
+        row = next(self._read("SELECT name, topic, notax, price FROM products WHERE name = ?",
+                              (products.normalize_name(name),)), None)
+        return ProductRow(*row) if row else None
+
+    def rows(self):
+        # Every product in creation order, read in pages so the whole catalog is never in memory
+        # (SQLite steps through the rows as they're asked for)
+        for row in self._read("SELECT name, topic, notax, price FROM products ORDER BY id"):
+            yield ProductRow(*row)
+
+    def delete(self, name) -> bool:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM products WHERE name = ?",
+                                    (products.normalize_name(name),)).rowcount > 0
+
+    @products.instrumented("sqlite.delete_many")
+    def delete_many(self, names):
+        # Same result as products.delete_products_many(): (names deleted, names not found)
+        names = [products.normalize_name(name) for name in names]
+        deleted = set()
+        with self._lock, self._db:
+            for name in names:
+                if self._db.execute("DELETE FROM products WHERE name = ?", (name,)).rowcount:
+                    deleted.add(name)
+        return deleted, set(names) - deleted
+
+    # ------ QUERIES ------
+    @products.instrumented("sqlite.search")
+    def search(self, query, limit=None, prefix=False):
+        # Same results as searchindex.search_names(): exact match first, then the names starting
+        # with 'query', then the ones containing it, each group in creation order.
+        # Prefix searches are index range scans, the rest are scanned by SQLite itself
+        query = query.strip().lower()
+        if not query:
+            return []
+        if prefix:
+            sql = ("SELECT name FROM products WHERE name_lower >= ? AND name_lower < ? "
+                   "ORDER BY name_lower != ?, id")
+            params = [query, _prefix_end(query), query]
+        else:
+            sql = ("SELECT name FROM products WHERE instr(name_lower, ?) "
+                   "ORDER BY CASE WHEN name_lower = ? THEN 0 WHEN instr(name_lower, ?) = 1 THEN 1 ELSE 2 END, id")
+            params = [query, query, query]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [name for name, in self._read(sql, params)]
+
+    @products.instrumented("sqlite.query")
+    def query(self, topic=None, min_price=None, max_price=None, order_by=None, limit=None):
+        # Same as products.query(), answered from the (topic, price) and price indexes
+        if order_by not in ORDERS:
+            raise ValueError(f"order_by must be one of {', '.join(map(str, ORDERS))}")
+        conditions, params = [], []
+        if topic is not None:
+            conditions.append("topic = ?")
+            params.append(topic.lower())
+        if min_price is not None:
+            conditions.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            params.append(max_price)
+        sql = "SELECT name, topic, notax, price FROM products"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {ORDERS[order_by]}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [ProductRow(*row) for row in self._read(sql, params)]
+
+    # ------ JSON INTERCHANGE ------
+    @products.instrumented("sqlite.import")
+    def import_json(self, filename="products.json", batch_size=10000, progress=None, cancel=None,
+                    reject_report=None):
+        # Streams an exported products .json into the database, like products.import_prd_from_json():
+        # products that already exist are skipped and broken ones are counted by reason.
+        # The whole file is imported in one transaction, so a broken file or a cancel imports nothing
+        try:
+            f = open(filename, "rb")
+        except FileNotFoundError:
+            products.get_logger().error("Couldn't find the file: %s", filename)
+            return False
+
+        rejects = products.RejectLog(filename)
+        parsed = broken = 0
+        batch_names, batch_topics, batch_prices = [], [], []
+
+        def commit():
+            nonlocal broken
+            imported = self._insert(batch_names, batch_topics, batch_prices, skip_existing=True, rejects=rejects)
+            for _ in range(len(batch_names) - imported):
+                rejects.add("duplicate")
+            batch_names.clear()
+            batch_topics.clear()
+            batch_prices.clear()
+            rejects.summarize()
+            if progress is not None:
+                progress(parsed, bytes_read, broken)
+            if cancel is not None and cancel.is_set():
+                raise products.OperationCancelled(f"Import of {filename} cancelled")
+
+        bytes_read = 0
+        try:
+            with f, self._lock, self._db:
+                for item, bytes_read in products.iter_json_array(f):
+                    if parsed and parsed % batch_size == 0:
+                        commit()
+                    parsed += 1
+                    fields, problem = products.check_product_item(item)
+                    if problem:
+                        rejects.add(problem, parsed - 1, item.get("name") if isinstance(item, dict) else None)
+                        broken += 1
+                        continue
+                    name, topic, price = fields
+                    batch_names.append(name)
+                    batch_topics.append(topic)
+                    batch_prices.append(price)
+                commit()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            products.get_logger().error("Couldn't read the file (Make sure it's an exported JSON): %s", filename)
+            return False
+        finally:
+            rejects.finish(reject_report)
+        return True
+
+    @products.instrumented("sqlite.export")
+    def export_json(self, filename="products.json", compact=False, ndjson=False, progress=None, cancel=None):
+        # Same files as products.export_prd_to_json(), read straight from the database
+        products.export_prd_to_json(filename, compact=compact, ndjson=ndjson, progress=progress,
+                                    cancel=cancel, rows=self.rows())
+
+    def import_topics_json(self, filename="topics.json"):
+        # Adds the topics of an exported .json, updating the tax of the ones that already exist
+        data = products.import_topics_json(filename, preview=True)
+        if not data:
+            return False
+        for topic in data:
+            for name, tax in topic.items():
+                try:
+                    self.create_topic(name, tax)
+                except ValueError:
+                    self.update_topic_tax(name, tax)
+        return True
+
+    def export_topics_json(self, filename="topics.json", topics_to_export=None):
+        rows = self._read("SELECT name, tax FROM topics WHERE custom ORDER BY rowid")
+        data = [{name: tax} for name, tax in rows if not topics_to_export or name in topics_to_export]
+        with products.atomic_write(filename) as f:
+            json.dump(data, f, indent=4)
+
+    # ------ IN-MEMORY REGISTRY ------
+    def load(self):
+        # Replaces the in-memory catalog (Product.get_instances() and products.topics) with the database's
+        for name, tax in self.topics().items():
+            if name not in products.topics:
+                products.create_topic(name, tax)
+            elif products.topics[name] != tax:
+                products.update_topic_tax(name, tax)
+        products.Product.get_instances().clear()
+        names, product_topics, prices = [], [], []
+        for name, topic, notax, _ in self.rows():
+            names.append(name)
+            product_topics.append(topic)
+            prices.append(notax)
+        products.create_many(names, product_topics, prices)
+
+    @products.instrumented("sqlite.save")
+    def save(self):
+        # Replaces the database's catalog with the in-memory one, in a single transaction
+        with self._lock, self._db:
+            for name, tax in list(products.topics.items())[10:]:
+                self._db.execute("INSERT INTO topics (name, tax) VALUES (?, ?) "
+                                 "ON CONFLICT (name) DO UPDATE SET tax = excluded.tax", (name, tax))
+            for name, tax in DEFAULT_TOPICS.items():
+                self._db.execute("UPDATE topics SET tax = ? WHERE name = ?", (products.topics[name], name))
+            self._db.execute("DELETE FROM products")
+            self._db.executemany("INSERT INTO products (name, name_lower, topic, notax, price) VALUES (?, ?, ?, ?, ?)",
+                                 ((name, name.lower(), topic, notax, price)
+                                  for name, topic, notax, price in products.Product.get_instances().rows()))
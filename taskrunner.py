@@ -0,0 +1,153 @@
+# taskrunner.py
+# Runs long imports/exports on a background thread, so the windows keep responding.
+# TaskDialog shows the progress (items and bytes processed) with a Cancel button.
+
+import threading
+
+import products
+
+from PyQt5.QtWidgets import QDialog, QLabel, QProgressBar, QPushButton, QVBoxLayout
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+# Calls job(progress, cancel) on its own thread. The job reports through
+# progress(items, bytes=0, rejects=0) and should stop with products.OperationCancelled
+# once the 'cancel' event is set
+class TaskWorker(QThread):
+    # Signals carry Python objects, byte counts don't fit in a C int for big files
+    progress = pyqtSignal(object, object, object)
+    finished_ok = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            result = self.job(self.report, self.cancel_event)
+        except products.OperationCancelled:
+            self.cancelled.emit()
+        except Exception as error:
+            self.failed.emit(str(error))
+        else:
+            self.finished_ok.emit(result)
+
+    def report(self, items, size=0, rejects=0):
+        self.progress.emit(items, size, rejects)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+# Modal dialog running a job on a TaskWorker. 'total' is the expected amount of
+# 'unit' ("bytes" or "items") used to fill the progress bar, 0 if it isn't known.
+# Once exec_() returns, 'status' is "done", "cancelled" or "failed", and 'result',
+# 'error', 'items', 'bytes' and 'rejects' hold what happened
+class TaskDialog(QDialog):
+    def __init__(self, title, job, total=0, unit="bytes", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setMinimumWidth(350)
+
+        self.total = total
+        self.unit = unit
+        self.status = "running"
+        self.result = None
+        self.error = None
+        self.items = 0
+        self.bytes = 0
+        self.rejects = 0
+
+        self.title = QLabel(title, self)
+        self.progress_label = QLabel("Starting...", self)
+        self.progress_bar = QProgressBar(self)
+        self.cancel_button = QPushButton("Cancel", self)
+
+        # The bar goes per mille, since byte counts can be bigger than a QProgressBar allows
+        if total:
+            self.progress_bar.setRange(0, 1000)
+        else:
+            # Unknown size, the bar just shows that something is happening
+            self.progress_bar.setRange(0, 0)
+
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.title)
+        vbox.addWidget(self.progress_bar)
+        vbox.addWidget(self.progress_label)
+        vbox.addWidget(self.cancel_button)
+        self.setLayout(vbox)
+
+        self.title.setAlignment(Qt.AlignCenter)
+        self.progress_label.setAlignment(Qt.AlignCenter)
+
+        self.setStyleSheet("""
+            * {
+                font-size: 16px;
+                font-family: Calibri;
+            }
+        """)
+
+        self.worker = TaskWorker(job, self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.finished_ok.connect(self.task_done)
+        self.worker.failed.connect(self.task_failed)
+        self.worker.cancelled.connect(self.task_cancelled)
+        self.cancel_button.clicked.connect(self.cancel)
+
+    def exec_(self):
+        self.worker.start()
+        return super().exec_()
+
+    def update_progress(self, items, size, rejects):
+        self.items, self.bytes, self.rejects = items, size, rejects
+        if self.total:
+            done = size if self.unit == "bytes" else items
+            self.progress_bar.setValue(min(1000, done * 1000 // self.total))
+        text = f"{items} item/s · {format_bytes(size)}"
+        if rejects:
+            text += f" · {rejects} broken"
+        self.progress_label.setText(text)
+
+    def cancel(self):
+        # The job stops at its next batch, the dialog closes once it does
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setText("Cancelling...")
+        self.worker.cancel()
+
+    def _close(self, status, code):
+        self.status = status
+        self.worker.wait()
+        self.done(code)
+
+    def task_done(self, result):
+        self.result = result
+        self._close("done", QDialog.Accepted)
+
+    def task_failed(self, error):
+        self.error = error
+        self._close("failed", QDialog.Rejected)
+
+    def task_cancelled(self):
+        self._close("cancelled", QDialog.Rejected)
+
+    def reject(self):
+        # Esc or closing the window cancels the job instead of leaving it running
+        if self.status == "running":
+            self.cancel()
+        else:
+            super().reject()
+
+    def closeEvent(self, event):
+        if self.status == "running":
+            self.cancel()
+            event.ignore()
+        else:
+            super().closeEvent(event)
@@ -0,0 +1,42 @@
+# test_journal.py
+# Saving with a CatalogJournal and loading it back in a fresh process, like a restart would
+
+import json
+import os
+import subprocess
+import sys
+
+import products
+from journal import CatalogJournal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_in_new_process(directory):
+    # Returns the products and custom topics a brand new process gets from load()
+    script = ("import json, products, journal\n"
+              "journal.CatalogJournal('catalog.snap', 'catalog.journal').load()\n"
+              "print(json.dumps([sorted(products.Product.get_instances().rows()), products.topics]))\n")
+    env = dict(os.environ, PYTHONPATH=HERE)
+    output = subprocess.run([sys.executable, "-c", script], cwd=directory, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    rows, topics = json.loads(output)
+    return [tuple(row) for row in rows], topics
+
+def test_first_save_keeps_the_products_from_before_the_journal(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    products.Product.get_instances().clear()
+    products.create_topic("foo", 20)
+    products.create_many(["a", "b"], ["foo", "tech"], [1, 2])
+
+    catalog = CatalogJournal("catalog.snap", "catalog.journal")
+    try:
+        products.create_many(["c"], ["foo"], [3])
+        catalog.save()
+    finally:
+        catalog.close()
+        products.Product.get_instances().clear()
+        del products.topics["foo"]
+
+    rows, topics = load_in_new_process(tmp_path)
+    assert rows == [("A", "foo", 1.0, 1.2), ("B", "tech", 2.0, 2.32), ("C", "foo", 3.0, 3.6)]
+    assert topics["foo"] == 20
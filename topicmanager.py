@@ -1,4 +1,5 @@
 import products
+from taskrunner import TaskDialog
 import sys
 from PyQt5.QtWidgets import (QApplication, QWidget, QMessageBox, QLabel, QPushButton,
                              QLineEdit, QDialog, QHBoxLayout, QVBoxLayout, QInputDialog,
@@ -106,15 +107,33 @@ class TopicManager(QWidget):
         # Checks what file the user wants to import from
         default = QMessageBox.question(self, "Import", "Would you like to use default file (topics.json)?")
         if default == QMessageBox.Yes:
-            data = products.import_topics_json(preview=True)  # Will import from topics.json
+            file = "topics.json"  # Will import from topics.json
         elif default == QMessageBox.No:
             file, ok = QInputDialog.getText(self, "Import",
                                             "Enter the directory of the file being imported (.json needed):")
-            if ok and file:
-                data = products.import_topics_json(file, preview=True)
-            else:
+            if not (ok and file):
                 QMessageBox.critical(self, "Error", "The directory is invalid")
                 return
+        else:
+            return
+
+        # The file is read in the background, so the window keeps responding.
+        # It's read in one go, Cancel just drops what was read
+        def read_topics(progress, cancel):
+            data = products.import_topics_json(file, preview=True)
+            if cancel.is_set():
+                raise products.OperationCancelled
+            progress(len(data))
+            return data
+
+        loader = TaskDialog("Reading Topics", read_topics, parent=self)
+        loader.exec_()
+        if loader.status == "cancelled":
+            return
+        if loader.status == "failed":
+            QMessageBox.critical(self, "Error", f"Could not read the topics:\n{loader.error}")
+            return
+        data = loader.result
 
         if not data:
             QMessageBox.critical(self, "Error", "No topics found in .json file")
@@ -145,6 +164,8 @@ class TopicManager(QWidget):
             else:
                 QMessageBox.critical(self, "Error", "The directory is invalid")
                 return
+        else:
+            return
 
         dialog = TopicExportDialog(self)
         # Opens the Export Dialog for the user to select the topics
@@ -158,8 +179,22 @@ class TopicManager(QWidget):
                 QMessageBox.warning(self, "Warning", "No topics selected for export.")
                 return
 
-            products.export_topics_json(filedir, topics_to_export=selected_names)
-            QMessageBox.information(self, "Success", f"{len(selected_names)} topic(s) exported.")
+            # Written in the background to a temporary file, so the old file stays intact if it fails.
+            # Cancelling only works before the file is written, which is a single step
+            def write_topics(progress, cancel):
+                if cancel.is_set():
+                    raise products.OperationCancelled
+                products.export_topics_json(filedir, topics_to_export=selected_names)
+                progress(len(selected_names))
+
+            writer = TaskDialog("Exporting Topics", write_topics, parent=self)
+            writer.exec_()
+            if writer.status == "cancelled":
+                self.message_label.setText("Export cancelled")
+            elif writer.status == "done":
+                QMessageBox.information(self, "Success", f"{len(selected_names)} topic(s) exported.")
+            elif writer.status == "failed":
+                QMessageBox.critical(self, "Error", f"Could not export the topics:\n{writer.error}")
 
 class TopicImportDialog(QDialog):
     def __init__(self, topics_list, parent=None):